@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+
+from standings import is_round_complete
+from storage import JOURNAL_SUFFIX, SNAPSHOT_SUFFIX, write_file_atomic
+
+CATALOG_FILENAME = "catalogo.idx"
+CATALOG_FORMAT = 1
+PUBLIC_FIELDS = ("id", "name", "completed_rounds", "total_rounds", "finished")
+
+
+def summarize_tournament(data):
+    rounds = data.get("rounds", []) or []
+    total_rounds = len(rounds)
+    completed_rounds = sum(1 for round_info in rounds if is_round_complete(round_info))
+    return {
+        "id": data.get("id"),
+        "completed_rounds": completed_rounds,
+        "total_rounds": total_rounds,
+        "finished": total_rounds > 0 and completed_rounds >= total_rounds,
+    }
+
+
+def _file_signature(stat_result):
+    if stat_result is None:
+        return None
+    return [stat_result.st_mtime_ns, stat_result.st_size]
+
+
+class TournamentCatalog:
+    """Indice persistente de los torneos guardados en ``directory``.
+
+    Cada entrada guarda el resumen del torneo junto con el mtime y tamano de
+    su snapshot (y de su diario). Al listar solo se vuelve a leer un torneo
+    si esa firma ha cambiado.
+    """
+
+    def __init__(self, directory, loader):
+        self.directory = directory
+        self.loader = loader
+        self.path = os.path.join(directory, CATALOG_FILENAME)
+        self._lock = threading.Lock()
+        self._entries = None
+        self._dirty = False
+
+    def _load_index(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                stored = json.load(file)
+        except (OSError, ValueError):
+            return
+        if stored.get("format") != CATALOG_FORMAT:
+            return
+        self._entries = stored.get("tournaments") or {}
+
+    def _save_index(self):
+        if not self._dirty:
+            return
+        payload = json.dumps(
+            {"format": CATALOG_FORMAT, "tournaments": self._entries},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        try:
+            write_file_atomic(self.path, payload, generations=0, fsync=False)
+        except OSError:
+            return
+        self._dirty = False
+
+    def _scan(self):
+        snapshots = {}
+        journals = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                if entry.name.endswith(SNAPSHOT_SUFFIX):
+                    snapshots[entry.name[: -len(SNAPSHOT_SUFFIX)]] = entry.stat()
+                elif entry.name.endswith(JOURNAL_SUFFIX):
+                    journals[entry.name[: -len(JOURNAL_SUFFIX)]] = entry.stat()
+        return {
+            file_base: [_file_signature(stat), _file_signature(journals.get(file_base))]
+            for file_base, stat in snapshots.items()
+        }
+
+    def _signature(self, file_base):
+        signature = []
+        for suffix in (SNAPSHOT_SUFFIX, JOURNAL_SUFFIX):
+            try:
+                stat_result = os.stat(os.path.join(self.directory, file_base + suffix))
+            except OSError:
+                stat_result = None
+            signature.append(_file_signature(stat_result))
+        return signature
+
+    def _store(self, file_base, data, signature):
+        summary = summarize_tournament(data)
+        previous = self._entries.get(file_base)
+        self._entries[file_base] = {
+            "id": summary["id"] or file_base,
+            "name": file_base,
+            "completed_rounds": summary["completed_rounds"],
+            "total_rounds": summary["total_rounds"],
+            "finished": summary["finished"],
+            "signature": signature,
+        }
+        self._dirty = True
+        changed = previous is None or any(
+            previous.get(key) != self._entries[file_base][key] for key in PUBLIC_FIELDS
+        )
+        return self._public(file_base), changed
+
+    def _public(self, file_base):
+        entry = self._entries[file_base]
+        return {key: entry[key] for key in PUBLIC_FIELDS}
+
+    def list(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            self._load_index()
+            current = self._scan()
+            for file_base in list(self._entries):
+                if file_base not in current:
+                    del self._entries[file_base]
+                    self._dirty = True
+            for file_base, signature in current.items():
+                entry = self._entries.get(file_base)
+                if entry is not None and entry.get("signature") == signature:
+                    continue
+                try:
+                    data = self.loader(file_base)
+                except (OSError, ValueError):
+                    data = None
+                if data is None:
+                    self._entries.pop(file_base, None)
+                    self._dirty = True
+                    continue
+                self._store(file_base, data, signature)
+            self._save_index()
+            items = [self._public(file_base) for file_base in self._entries]
+        items.sort(key=lambda item: (item["finished"], item["name"].lower()))
+        return items
+
+    def update(self, file_base, data):
+        """Actualiza la entrada y devuelve ``(item, cambiado)``."""
+        with self._lock:
+            self._load_index()
+            return self._store(file_base, data, self._signature(file_base))
+
+    def refresh(self, file_base):
+        """Toma la firma actual de los ficheros tras una escritura diferida.
+
+        El resumen ya se actualizo con ``update``; asi ``list`` no vuelve a
+        leer el torneo solo porque se vacio a disco despues.
+        """
+        with self._lock:
+            self._load_index()
+            entry = self._entries.get(file_base)
+            if entry is None:
+                return
+            signature = self._signature(file_base)
+            if entry.get("signature") != signature:
+                entry["signature"] = signature
+                self._dirty = True
+
+    def remove(self, file_base):
+        with self._lock:
+            self._load_index()
+            if self._entries.pop(file_base, None) is not None:
+                self._dirty = True
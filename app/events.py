@@ -0,0 +1,174 @@
+import json
+import threading
+from collections import deque
+
+from standings import (
+    build_scoreboard_rows,
+    compute_player_stats,
+    get_active_round_index,
+    is_match_complete,
+)
+
+HISTORY_SIZE = 512
+KEEPALIVE_SECONDS = 15
+CATALOG_CHANNEL = "*"
+
+
+class EventBroker:
+    """Historial de eventos versionados por canal (un canal por torneo).
+
+    Los clientes piden los eventos posteriores a la version que conocen; si
+    ese tramo ya no esta en el historial reciben ``None`` y deben recargar.
+    """
+
+    def __init__(self, history=HISTORY_SIZE):
+        self.history = history
+        self._condition = threading.Condition()
+        self._channels = {}
+        self._closed = False
+
+    def _channel(self, channel, version=0):
+        state = self._channels.get(channel)
+        if state is None:
+            state = {"version": version, "events": deque(maxlen=self.history)}
+            self._channels[channel] = state
+        return state
+
+    def ensure(self, channel, version):
+        with self._condition:
+            state = self._channel(channel, version)
+            if version > state["version"]:
+                # El torneo avanzo sin pasar por aqui (p. ej. tras reiniciar).
+                state["version"] = version
+                state["events"].clear()
+            return state["version"]
+
+    def version(self, channel):
+        with self._condition:
+            state = self._channels.get(channel)
+            return state["version"] if state else 0
+
+    def publish(self, channel, events, version=None):
+        with self._condition:
+            state = self._channel(channel)
+            if version is None:
+                version = state["version"] + 1
+            for event in events:
+                state["events"].append((version, event))
+            state["version"] = max(state["version"], version)
+            self._condition.notify_all()
+            return version
+
+    def close(self):
+        """Termina los flujos abiertos (al apagar el servidor)."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def discard(self, channel):
+        with self._condition:
+            self._channels.pop(channel, None)
+            self._condition.notify_all()
+
+    def _since_locked(self, channel, since):
+        state = self._channels.get(channel)
+        if state is None:
+            return [] if since == 0 else None
+        if since == state["version"]:
+            return []
+        if since > state["version"]:
+            return None
+        events = state["events"]
+        if not events or events[0][0] > since + 1:
+            return None
+        return [(version, event) for version, event in events if version > since]
+
+    def events_since(self, channel, since):
+        with self._condition:
+            return self._since_locked(channel, since)
+
+    def wait(self, channel, since, timeout=KEEPALIVE_SECONDS):
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._closed or self._since_locked(channel, since) != [],
+                timeout,
+            )
+            return self._since_locked(channel, since)
+
+    def stream(self, channel, since, keepalive=KEEPALIVE_SECONDS):
+        """Generador de texto ``text/event-stream`` a partir de ``since``."""
+        yield "retry: 3000\n\n"
+        while True:
+            pending = self.wait(channel, since, keepalive)
+            if pending is None:
+                yield format_sse({"type": "reload"}, self.version(channel))
+                return
+            if not pending:
+                if self._closed:
+                    return
+                yield ": keepalive\n\n"
+                continue
+            for version, event in pending:
+                yield format_sse(event, version)
+                since = version
+
+
+def format_sse(event, version):
+    payload = json.dumps(dict(event, version=version), ensure_ascii=False)
+    return f"id: {version}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+
+def build_result_events(data, changes, ranking=None):
+    """Eventos de un lote de resultados.
+
+    ``changes`` son ``(round_index, match_index, resultado_anterior)``. Sale
+    un evento ``match`` por partido, uno ``round`` por ronda que cambia de
+    estado y, si algun cambio cuenta para la tabla, un solo ``ranking``.
+    """
+    rounds = data.get("rounds", []) or []
+    events = []
+    previous_by_round = {}
+    ranking_changed = False
+    for round_index, match_index, previous_result in changes:
+        match = rounds[round_index]["matches"][match_index]
+        result = dict(match.get("result") or {})
+        events.append(
+            {
+                "type": "match",
+                "round_index": round_index,
+                "match_index": match_index,
+                "result": result,
+            }
+        )
+        # Si el lote toca dos veces el mismo partido manda el primer anterior.
+        previous_by_round.setdefault(round_index, {}).setdefault(
+            match_index, {"result": previous_result}
+        )
+        previous = {"result": previous_result}
+        counted = is_match_complete(match) or is_match_complete(previous)
+        if counted and dict(previous_result or {}) != result:
+            ranking_changed = True
+    active_round_index = None
+    for round_index, previous_matches in sorted(previous_by_round.items()):
+        matches = rounds[round_index].get("matches", []) or []
+        completed = all(is_match_complete(match) for match in matches)
+        was_completed = all(
+            is_match_complete(previous_matches.get(index, match))
+            for index, match in enumerate(matches)
+        )
+        if completed != was_completed:
+            if active_round_index is None:
+                active_round_index = get_active_round_index(rounds)
+            events.append(
+                {
+                    "type": "round",
+                    "round_index": round_index,
+                    "completed": completed,
+                    "active_round_index": active_round_index,
+                }
+            )
+    if ranking_changed:
+        if ranking is None:
+            ranking = build_scoreboard_rows(compute_player_stats(data))
+        events.append({"type": "ranking", "rows": ranking})
+    return events
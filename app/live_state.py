@@ -0,0 +1,316 @@
+import threading
+import time
+
+from standings import build_scoreboard_rows, compute_player_stats
+
+
+class FrozenDict(dict):
+    """Diccionario de solo lectura que se puede compartir entre hilos."""
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("El estado compartido del torneo es de solo lectura")
+
+    __setitem__ = _readonly
+    __delitem__ = _readonly
+    __ior__ = _readonly
+    clear = _readonly
+    pop = _readonly
+    popitem = _readonly
+    setdefault = _readonly
+    update = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value):
+    if isinstance(value, FrozenDict):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+class LiveTournament:
+    """Ultima foto publicada de un torneo abierto.
+
+    Cada torneo tiene su propio cerrojo y su version: publicar uno no hace
+    esperar a quien lee otro.
+    """
+
+    __slots__ = ("id", "data", "ranking", "version", "lock")
+
+    def __init__(self, tournament_id):
+        self.id = tournament_id
+        self.data = None
+        self.ranking = None
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def read(self):
+        with self.lock:
+            return self.data, self.ranking, self.version
+
+
+# El cerrojo global solo protege el registro y lo que muestra la pantalla;
+# la version global cambia cuando cambia lo que se ve en ella.
+_state_lock = threading.Lock()
+_state_changed = threading.Condition(_state_lock)
+_live = {}
+_tournament_state = {
+    "version": 0,
+    "current": None,
+    "pinned": None,
+    "rotate_seconds": 0,
+    "rotation_index": 0,
+    "rotation_thread": None,
+}
+
+
+def _displayed_id_locked():
+    pinned = _tournament_state["pinned"]
+    if pinned in _live:
+        return pinned
+    if _tournament_state["rotate_seconds"] and _live:
+        ids = list(_live)
+        return ids[_tournament_state["rotation_index"] % len(ids)]
+    return _tournament_state["current"]
+
+
+def _bump_locked():
+    _tournament_state["version"] += 1
+    _state_changed.notify_all()
+
+
+def _refreeze(previous, data, matches):
+    """Congela solo los partidos ``matches`` y reutiliza el resto de ``previous``."""
+    rounds = list(previous["rounds"])
+    for round_index, match_index in sorted(set(matches)):
+        frozen_round = rounds[round_index]
+        frozen_matches = list(frozen_round["matches"])
+        frozen_matches[match_index] = freeze(
+            data["rounds"][round_index]["matches"][match_index]
+        )
+        rounds[round_index] = FrozenDict(frozen_round, matches=tuple(frozen_matches))
+    return FrozenDict(
+        (key, tuple(rounds) if key == "rounds" else freeze(value))
+        for key, value in data.items()
+    )
+
+
+def _publish(slot, data, ranking, matches=None):
+    version = data.get("version", 0)
+    with slot.lock:
+        previous, previous_version = slot.data, slot.version
+    if previous is not None and version < previous_version:
+        return
+    # Se congela fuera del cerrojo: los lectores nunca esperan a la copia. Un
+    # lote de resultados sube la version en uno, asi que si la foto publicada
+    # es la inmediatamente anterior basta con congelar lo que cambio.
+    if (
+        matches is not None
+        and previous is not None
+        and previous_version == version - 1
+        and len(previous.get("rounds") or ()) == len(data.get("rounds") or ())
+    ):
+        snapshot = _refreeze(previous, data, matches)
+    else:
+        snapshot = freeze(data)
+    if ranking is None:
+        ranking = build_scoreboard_rows(compute_player_stats(data))
+    rows = freeze(ranking)
+    with slot.lock:
+        if slot.data is not None and version < slot.version:
+            return
+        slot.data = snapshot
+        slot.ranking = rows
+        slot.version = version
+    with _state_lock:
+        if _live.get(slot.id) is slot and _displayed_id_locked() == slot.id:
+            _bump_locked()
+
+
+def add_tournament(data, ranking=None):
+    """Abre el torneo en el registro (crear, abrir o fijar) y publica su foto."""
+    tournament_id = data.get("id")
+    with _state_lock:
+        slot = _live.get(tournament_id)
+        if slot is None:
+            slot = _live[tournament_id] = LiveTournament(tournament_id)
+    _publish(slot, data, ranking)
+
+
+def publish_tournament(data, ranking=None, matches=None):
+    """Actualiza la foto de un torneo abierto sin cambiar lo que se muestra.
+
+    Los torneos que no estan abiertos se ignoran: solo ``add_tournament`` los
+    abre. ``matches`` son los ``(ronda, partido)`` que cambiaron desde la
+    version anterior; sin ellos se congela el torneo entero. Si no se pasa
+    ``ranking`` se calcula aqui desde cero. Una foto mas antigua que la
+    publicada (por ``data["version"]``) se descarta.
+    """
+    with _state_lock:
+        slot = _live.get(data.get("id"))
+    if slot is not None:
+        _publish(slot, data, ranking, matches)
+
+
+def set_current_tournament(data, ranking=None):
+    """Abre el torneo y lo pone en pantalla (salvo que haya otro fijado)."""
+    add_tournament(data, ranking)
+    with _state_lock:
+        _tournament_state["current"] = data.get("id")
+        _bump_locked()
+
+
+def clear_current_tournament():
+    """Vuelve a la pantalla de inicio; los torneos siguen abiertos."""
+    with _state_lock:
+        _tournament_state["current"] = None
+        _bump_locked()
+
+
+def remove_tournament(tournament_id):
+    with _state_lock:
+        if _live.pop(tournament_id, None) is None:
+            return
+        if _tournament_state["current"] == tournament_id:
+            _tournament_state["current"] = None
+        if _tournament_state["pinned"] == tournament_id:
+            _tournament_state["pinned"] = None
+        _bump_locked()
+
+
+def live_tournaments():
+    with _state_lock:
+        return list(_live)
+
+
+def get_tournament(tournament_id):
+    """``(snapshot, version)`` de un torneo abierto, sin copiar."""
+    with _state_lock:
+        slot = _live.get(tournament_id)
+    if slot is None:
+        return None, 0
+    data, _ranking, version = slot.read()
+    return data, version
+
+
+def get_tournament_ranking(tournament_id):
+    with _state_lock:
+        slot = _live.get(tournament_id)
+    return slot.read()[1] if slot is not None else None
+
+
+def _displayed_slot():
+    with _state_lock:
+        slot = _live.get(_displayed_id_locked())
+        version = _tournament_state["version"]
+    return slot, version
+
+
+def get_current_tournament():
+    """Devuelve ``(snapshot, version)`` sin copiar: el snapshot es inmutable.
+
+    Es el torneo que toca mostrar: el fijado, el del turno de rotacion o el
+    ultimo abierto. La version es la de la pantalla, no la del torneo.
+    """
+    slot, version = _displayed_slot()
+    if slot is None:
+        return None, version
+    return slot.read()[0], version
+
+
+def get_current_ranking():
+    """Filas de clasificacion del torneo en pantalla (tuplas inmutables) o ``None``."""
+    slot, _version = _displayed_slot()
+    return slot.read()[1] if slot is not None else None
+
+
+def get_current_version():
+    return _tournament_state["version"]
+
+
+def display_settings():
+    with _state_lock:
+        return {
+            "current": _tournament_state["current"],
+            "pinned": _tournament_state["pinned"],
+            "rotate_seconds": _tournament_state["rotate_seconds"],
+            "showing": _displayed_id_locked(),
+            "live": list(_live),
+        }
+
+
+def pin_display(tournament_id):
+    """Fija un torneo abierto en pantalla; ``None`` lo suelta."""
+    with _state_lock:
+        if tournament_id is not None and tournament_id not in _live:
+            raise KeyError(tournament_id)
+        _tournament_state["pinned"] = tournament_id
+        _bump_locked()
+
+
+def set_rotation(seconds):
+    """Rota la pantalla entre los torneos abiertos cada ``seconds``; 0 la para."""
+    seconds = max(0, int(seconds))
+    with _state_lock:
+        _tournament_state["rotate_seconds"] = seconds
+        _bump_locked()
+        thread = _tournament_state["rotation_thread"]
+        if seconds and (thread is None or not thread.is_alive()):
+            thread = threading.Thread(
+                target=_rotate, name="display-rotation", daemon=True
+            )
+            _tournament_state["rotation_thread"] = thread
+            thread.start()
+
+
+def _rotate():
+    with _state_changed:
+        seconds = None
+        while _tournament_state["rotate_seconds"]:
+            if seconds != _tournament_state["rotate_seconds"]:
+                seconds = _tournament_state["rotate_seconds"]
+                due = time.monotonic() + seconds
+            remaining = due - time.monotonic()
+            if remaining > 0:
+                # Cualquier aviso despierta el hilo; solo rota cuando vence.
+                _state_changed.wait(remaining)
+                continue
+            due = time.monotonic() + seconds
+            if len(_live) > 1 and _tournament_state["pinned"] not in _live:
+                _tournament_state["rotation_index"] += 1
+                _bump_locked()
+        _tournament_state["rotation_thread"] = None
+
+
+def wait_for_change(version, timeout=None):
+    """Bloquea hasta que la version sea distinta de ``version``.
+
+    Devuelve ``(snapshot, version)``; si vence ``timeout`` la version devuelta
+    puede ser la misma que la recibida.
+    """
+    with _state_changed:
+        _state_changed.wait_for(
+            lambda: _tournament_state["version"] != version, timeout
+        )
+    return get_current_tournament()
@@ -0,0 +1,104 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class LockManager:
+    """Un cerrojo reentrante por clave (id de torneo) con metricas de espera.
+
+    Por cada clave se cuenta cuantas veces se tomo, cuantas hubo que
+    esperar, el tiempo total y maximo de espera y el tiempo retenido.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def _entry(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {
+                    "lock": threading.RLock(),
+                    "acquired": 0,
+                    "contended": 0,
+                    "wait_seconds": 0.0,
+                    "max_wait_seconds": 0.0,
+                    "held_seconds": 0.0,
+                    "depth": threading.local(),
+                    "users": 0,
+                    "forgotten": False,
+                }
+                self._entries[key] = entry
+            entry["users"] += 1
+            return entry
+
+    def _release(self, key, entry):
+        with self._lock:
+            entry["users"] -= 1
+            if (
+                entry["forgotten"]
+                and not entry["users"]
+                and self._entries.get(key) is entry
+            ):
+                del self._entries[key]
+
+    @contextmanager
+    def hold(self, key):
+        entry = self._entry(key)
+        lock = entry["lock"]
+        waited = 0.0
+        try:
+            if not lock.acquire(blocking=False):
+                started = time.perf_counter()
+                lock.acquire()
+                waited = time.perf_counter() - started
+        except BaseException:
+            self._release(key, entry)
+            raise
+        depth = getattr(entry["depth"], "value", 0)
+        entry["depth"].value = depth + 1
+        acquired_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry["depth"].value = depth
+            # Las metricas se actualizan con el cerrojo aun tomado; las
+            # reentradas del mismo hilo no cuentan como otra adquisicion.
+            if depth == 0:
+                entry["acquired"] += 1
+                entry["held_seconds"] += time.perf_counter() - acquired_at
+                if waited:
+                    entry["contended"] += 1
+                    entry["wait_seconds"] += waited
+                    entry["max_wait_seconds"] = max(entry["max_wait_seconds"], waited)
+            lock.release()
+            self._release(key, entry)
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._entries.items())
+        result = {}
+        for key, entry in entries:
+            acquired = entry["acquired"]
+            result[key] = {
+                "acquired": acquired,
+                "contended": entry["contended"],
+                "wait_seconds": round(entry["wait_seconds"], 6),
+                "max_wait_seconds": round(entry["max_wait_seconds"], 6),
+                "avg_hold_seconds": round(entry["held_seconds"] / acquired, 6)
+                if acquired
+                else 0.0,
+            }
+        return result
+
+    def forget(self, key):
+        """Descarta la clave; si alguien la tiene tomada o espera, al soltarla."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if entry["users"]:
+                entry["forgotten"] = True
+            else:
+                del self._entries[key]
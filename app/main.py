@@ -1,21 +1,31 @@
-import copy
-import json
+import atexit
+import multiprocessing
 import os
 import socket
 import threading
 import tkinter as tk
-from datetime import datetime
 
 from PIL import Image, ImageTk, ImageDraw
 import qrcode
-from flask import Flask, jsonify, render_template, request
+
+from live_state import (
+    get_current_ranking,
+    get_current_tournament,
+    get_current_version,
+    wait_for_change,
+)
+from scheduler import warm_executor
+from server import WebServer
+from standings import (
+    build_scoreboard_rows,
+    compute_player_stats,
+    get_active_round_index,
+)
+from webapp import SCHEDULES_DIR, TOURNAMENTS_DIR, create_app
 
 __version__ = "1.0.11"
 
 WEB_PORT = 5050
-TOURNAMENTS_DIR = os.path.join(os.path.dirname(__file__), "Torneos")
-_state_lock = threading.Lock()
-_tournament_state = {"data": None, "version": 0}
 
 # ============================
 # PALETA DE COLORES MEJORADA
@@ -71,20 +81,6 @@ FONT_LEGEND = (FONT_FAMILY, 12)
 DASHBOARD_LOGO_SIZE = 96
 DASHBOARD_LOGO_PADX = 20
 
-def set_current_tournament(data):
-    with _state_lock:
-        _tournament_state["data"] = copy.deepcopy(data)
-        _tournament_state["version"] += 1
-
-def clear_current_tournament():
-    with _state_lock:
-        _tournament_state["data"] = None
-        _tournament_state["version"] += 1
-
-def get_current_tournament():
-    with _state_lock:
-        return copy.deepcopy(_tournament_state["data"]), _tournament_state["version"]
-
 def slugify_name(name):
     cleaned = "".join(
         ch if ch.isalnum() or ch in ("-", "_") else "-" for ch in name.strip()
@@ -92,14 +88,6 @@ def slugify_name(name):
     cleaned = "-".join(filter(None, cleaned.split("-")))
     return cleaned.lower()
 
-def validate_filename(name):
-    invalid_chars = '<>:"/\\|?*'
-    if not name or name in (".", ".."):
-        return False
-    if name.endswith(" ") or name.endswith("."):
-        return False
-    return not any(ch in invalid_chars for ch in name)
-
 def get_local_ip():
     ip = "127.0.0.1"
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -203,190 +191,19 @@ def set_window_icon(root):
         pass
 
 def start_web_server():
-    app = Flask(__name__, template_folder="web/templates")
-
-    @app.route("/")
-    def index():
-        return render_template("home.html")
-
-    @app.route("/nuevo")
-    def new_tournament():
-        return render_template("index.html")
-
-    @app.route("/abrir")
-    def open_tournament():
-        return render_template("open.html")
-
-    @app.route("/results/<tournament_id>")
-    def results(tournament_id):
-        path = os.path.join(TOURNAMENTS_DIR, f"{tournament_id}.json")
-        if not os.path.exists(path):
-            return "Torneo no encontrado", 404
-        with open(path, "r", encoding="utf-8") as file:
-            data = json.load(file)
-        set_current_tournament(data)
-        return render_template("results.html", tournament=data)
-
-    @app.route("/clasificacion")
-    def ranking():
-        tournament, _version = get_current_tournament()
-        return render_template("ranking.html", tournament=tournament)
-
-    @app.route("/api/tournaments", methods=["POST"])
-    def create_tournament():
-        payload = request.get_json(silent=True)
-        if not payload:
-            return jsonify({"error": "Payload invalido"}), 400
-
-        requested_name = payload.get("name", "").strip()
-        if not requested_name:
-            requested_name = datetime.now().strftime("%Y%m%d%H%M%S")
-        if not validate_filename(requested_name):
-            return jsonify({"error": "Nombre de torneo invalido"}), 400
-        tournament_id = requested_name
-        os.makedirs(TOURNAMENTS_DIR, exist_ok=True)
-        path = os.path.join(TOURNAMENTS_DIR, f"{tournament_id}.json")
-        if os.path.exists(path):
-            return jsonify({"error": "Nombre de torneo existente"}), 409
-        data = {
-            "id": tournament_id,
-            "name": requested_name,
-            "rounds_count": payload.get("rounds_count"),
-            "courts": payload.get("courts"),
-            "players": payload.get("players", []),
-            "rounds": payload.get("rounds", []),
-        }
-        with open(path, "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=2)
-        set_current_tournament(data)
-        return jsonify({"id": tournament_id, "redirect": f"/results/{tournament_id}"})
-
-    @app.route("/api/tournaments/exists")
-    def tournament_exists():
-        name = request.args.get("name", "").strip()
-        if not name:
-            return jsonify({"exists": False})
-        if not validate_filename(name):
-            return jsonify({"exists": False})
-        path = os.path.join(TOURNAMENTS_DIR, f"{name}.json")
-        return jsonify({"exists": os.path.exists(path)})
-
-    @app.route("/api/ping")
-    def ping():
-        return jsonify({"status": "ok"})
-
-    @app.route("/api/current/clear", methods=["POST"])
-    def clear_current():
-        clear_current_tournament()
-        return jsonify({"status": "ok"})
-
-    @app.route("/api/tournaments/list")
-    def list_tournaments():
-        os.makedirs(TOURNAMENTS_DIR, exist_ok=True)
-        tournaments_path = os.path.abspath(TOURNAMENTS_DIR)
-        print(f"Leo los torneos de la ubicacion: {tournaments_path}")
-        items = []
-        for filename in os.listdir(TOURNAMENTS_DIR):
-            if not filename.endswith(".json"):
-                continue
-            path = os.path.join(TOURNAMENTS_DIR, filename)
-            try:
-                with open(path, "r", encoding="utf-8") as file:
-                    data = json.load(file)
-            except (OSError, json.JSONDecodeError):
-                continue
-            rounds = data.get("rounds", []) or []
-            total_rounds = len(rounds)
-            completed_rounds = 0
-            for round_info in rounds:
-                matches = round_info.get("matches", []) or []
-                if not matches:
-                    continue
-                all_done = True
-                for match in matches:
-                    result = match.get("result") or {}
-                    score_a = result.get("teamA")
-                    score_b = result.get("teamB")
-                    if not isinstance(score_a, int) or not isinstance(score_b, int):
-                        all_done = False
-                        break
-                if all_done:
-                    completed_rounds += 1
-            is_finished = total_rounds > 0 and completed_rounds >= total_rounds
-            file_base = filename.replace(".json", "")
-            items.append(
-                {
-                    "id": data.get("id") or file_base,
-                    "name": file_base,
-                    "completed_rounds": completed_rounds,
-                    "total_rounds": total_rounds,
-                    "finished": is_finished,
-                }
-            )
-        items.sort(key=lambda item: (item["finished"], item["name"].lower()))
-        return jsonify({"tournaments": items})
-
-    @app.route("/api/tournaments/<tournament_id>/open", methods=["POST"])
-    def open_tournament_api(tournament_id):
-        path = os.path.join(TOURNAMENTS_DIR, f"{tournament_id}.json")
-        if not os.path.exists(path):
-            return jsonify({"error": "Torneo no encontrado"}), 404
-        with open(path, "r", encoding="utf-8") as file:
-            data = json.load(file)
-        set_current_tournament(data)
-        return jsonify({"status": "ok", "redirect": f"/results/{tournament_id}"})
-
-    @app.route("/api/tournaments/<tournament_id>", methods=["DELETE"])
-    def delete_tournament(tournament_id):
-        path = os.path.join(TOURNAMENTS_DIR, f"{tournament_id}.json")
-        if not os.path.exists(path):
-            return jsonify({"error": "Torneo no encontrado"}), 404
-        try:
-            os.remove(path)
-        except OSError:
-            return jsonify({"error": "No se pudo borrar"}), 500
-        current, _version = get_current_tournament()
-        if current and current.get("id") == tournament_id:
-            clear_current_tournament()
-        return jsonify({"status": "ok"})
-
-    @app.route("/api/tournaments/<tournament_id>/results", methods=["POST"])
-    def update_results(tournament_id):
-        payload = request.get_json(silent=True)
-        if not payload:
-            return jsonify({"error": "Payload invalido"}), 400
-
-        path = os.path.join(TOURNAMENTS_DIR, f"{tournament_id}.json")
-        if not os.path.exists(path):
-            return jsonify({"error": "Torneo no encontrado"}), 404
-
-        round_index = payload.get("round_index")
-        match_index = payload.get("match_index")
-        result = payload.get("result", {})
-
-        if round_index is None or match_index is None:
-            return jsonify({"error": "Indices invalidos"}), 400
-
-        with open(path, "r", encoding="utf-8") as file:
-            data = json.load(file)
-
-        try:
-            match = data["rounds"][round_index]["matches"][match_index]
-        except (IndexError, KeyError, TypeError):
-            return jsonify({"error": "Partido no encontrado"}), 404
-
-        match["result"] = {
-            "teamA": result.get("teamA"),
-            "teamB": result.get("teamB"),
-        }
-
-        with open(path, "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=2)
-
-        set_current_tournament(data)
-        return jsonify({"status": "ok"})
-
-    app.run(host="0.0.0.0", port=WEB_PORT, debug=False, use_reloader=False)
+    app = create_app(
+        {"tournaments_dir": TOURNAMENTS_DIR, "schedules_dir": SCHEDULES_DIR}
+    )
+    state = app.extensions["torneos"]
+    warm_executor()
+    atexit.register(state["repository"].close)
+    atexit.register(state["schedule_jobs"].close)
+    # Modo, hilos y keep-alive salen de GTR_SERVER* (ver server.py).
+    server = WebServer(app, "0.0.0.0", WEB_PORT)
+    server.on_shutdown(state["broker"].close)
+    # atexit va en orden inverso: se vacia el servidor antes de guardar.
+    atexit.register(server.shutdown)
+    server.serve_forever()
 
 
 def start_gui():
@@ -666,69 +483,6 @@ def start_gui():
     # FUNCIONES DE RENDERIZADO MEJORADAS
     # ============================
 
-    def compute_player_stats(tournament):
-        stats = {}
-        for player in tournament.get("players", []):
-            stats[player] = {
-                "wins": 0,
-                "losses": 0,
-                "played": 0,
-                "points_for": 0,
-                "points_against": 0,
-            }
-        for round_info in tournament.get("rounds", []):
-            for match in round_info.get("matches", []):
-                result = match.get("result") or {}
-                score_a = result.get("teamA")
-                score_b = result.get("teamB")
-                if not isinstance(score_a, int) or not isinstance(score_b, int):
-                    continue
-                team_a = match.get("teams", [[], []])[0]
-                team_b = match.get("teams", [[], []])[1]
-                team_a_wins = score_a > score_b
-                team_b_wins = score_b > score_a
-
-                for player in team_a:
-                    stats.setdefault(
-                        player,
-                        {
-                            "wins": 0,
-                            "losses": 0,
-                            "played": 0,
-                            "points_for": 0,
-                            "points_against": 0,
-                        },
-                    )
-                    entry = stats[player]
-                    entry["played"] += 1
-                    entry["points_for"] += score_a
-                    entry["points_against"] += score_b
-                    if team_a_wins:
-                        entry["wins"] += 1
-                    elif team_b_wins:
-                        entry["losses"] += 1
-
-                for player in team_b:
-                    stats.setdefault(
-                        player,
-                        {
-                            "wins": 0,
-                            "losses": 0,
-                            "played": 0,
-                            "points_for": 0,
-                            "points_against": 0,
-                        },
-                    )
-                    entry = stats[player]
-                    entry["played"] += 1
-                    entry["points_for"] += score_b
-                    entry["points_against"] += score_a
-                    if team_b_wins:
-                        entry["wins"] += 1
-                    elif team_a_wins:
-                        entry["losses"] += 1
-        return stats
-
     rounds_ui = {
         "layout_sig": None,
         "data_sig": None,
@@ -756,25 +510,6 @@ def start_gui():
             signature.append((tuple(matches_sig), bench))
         return tuple(signature)
 
-    def get_active_round_index(rounds):
-        if not rounds:
-            return None
-        for index, round_info in enumerate(rounds):
-            matches = round_info.get("matches", []) or []
-            if not matches:
-                return index
-            all_done = True
-            for match in matches:
-                result = match.get("result") or {}
-                score_a = result.get("teamA")
-                score_b = result.get("teamB")
-                if not isinstance(score_a, int) or not isinstance(score_b, int):
-                    all_done = False
-                    break
-            if not all_done:
-                return index
-        return len(rounds) - 1
-
     ACTIVE_ROUND_MARK = " \U0001f535"
     BENCH_MARK = "\u23f8\ufe0f "
     EMPTY_ROUNDS_TEXT = "\U0001f4ed No hay rondas programadas"
@@ -1105,33 +840,6 @@ def start_gui():
                 col_index, weight=3 if is_name else 1
             )
 
-    def build_scoreboard_rows(stats):
-        def _scoreboard_sort_key(item):
-            player, stat = item
-            return (
-                -stat["wins"],
-                stat["losses"],
-                -(stat["points_for"] - stat["points_against"]),
-                -stat["points_for"],
-                player.lower(),
-            )
-
-        sorted_stats = sorted(stats.items(), key=_scoreboard_sort_key)
-        rows = []
-        for row_index, (player, stat) in enumerate(sorted_stats, start=1):
-            rows.append(
-                [
-                    row_index,
-                    player,
-                    stat["wins"],
-                    stat["losses"],
-                    stat["played"],
-                    stat["points_for"],
-                    stat["points_against"],
-                ]
-            )
-        return rows
-
     def ensure_scoreboard_row(row_index):
         while len(scoreboard_ui["rows"]) < row_index:
             row_widgets = []
@@ -1198,8 +906,7 @@ def start_gui():
             for cell_frame, _label in scoreboard_ui["rows"][extra_index - 1]:
                 cell_frame.grid_remove()
 
-    def render_scoreboard(stats):
-        rows = build_scoreboard_rows(stats)
+    def render_scoreboard(rows):
         data_sig = tuple(tuple(row) for row in rows)
         if data_sig == scoreboard_ui["data_sig"]:
             return
@@ -1210,8 +917,7 @@ def start_gui():
 
     dashboard_state = {
         "tournament_name": None,
-        "rounds_sig": None,
-        "players_sig": None,
+        "ranking": None,
     }
 
     def update_dashboard(tournament):
@@ -1220,15 +926,13 @@ def start_gui():
             tournament_title.config(text=tournament_name)
             dashboard_state["tournament_name"] = tournament_name
         render_rounds(tournament)
-        rounds_sig = rounds_ui["data_sig"]
-        players_sig = tuple(tournament.get("players", []) or [])
-        if (
-            rounds_sig != dashboard_state["rounds_sig"]
-            or players_sig != dashboard_state["players_sig"]
-        ):
-            render_scoreboard(compute_player_stats(tournament))
-            dashboard_state["rounds_sig"] = rounds_sig
-            dashboard_state["players_sig"] = players_sig
+        # La clasificacion llega ya calculada por el servidor web.
+        rows = get_current_ranking()
+        if rows is None:
+            rows = build_scoreboard_rows(compute_player_stats(tournament))
+        if rows is not dashboard_state["ranking"]:
+            render_scoreboard(rows)
+            dashboard_state["ranking"] = rows
 
     pending_render = {"scheduled": False, "tournament": None}
 
@@ -1248,11 +952,13 @@ def start_gui():
         root.after_idle(_apply)
 
     # ============================
-    # POLLING DE ACTUALIZACIONES
+    # AVISOS DE ACTUALIZACIONES
     # ============================
     last_version = {"value": 0}
 
-    def poll_updates():
+    def apply_updates(_event=None):
+        if get_current_version() == last_version["value"]:
+            return
         tournament, version = get_current_tournament()
         if tournament and version != last_version["value"]:
             last_version["value"] = version
@@ -1260,9 +966,28 @@ def start_gui():
                 qr_frame.pack_forget()
                 dashboard_frame.pack(expand=True, fill="both")
             schedule_dashboard_render(tournament)
+
+    def poll_updates():
+        apply_updates()
         root.after(500, poll_updates)
 
-    poll_updates()
+    def watch_updates(version):
+        while True:
+            _tournament, version = wait_for_change(version)
+            try:
+                root.event_generate("<<TournamentChanged>>", when="tail")
+            except (tk.TclError, RuntimeError):
+                return
+
+    root.bind("<<TournamentChanged>>", apply_updates)
+    apply_updates()
+    # Con Tcl sin hilos no se puede avisar a Tk desde otro hilo: se sondea.
+    if root.tk.call("info", "exists", "tcl_platform(threaded)"):
+        threading.Thread(
+            target=watch_updates, args=(last_version["value"],), daemon=True
+        ).start()
+    else:
+        poll_updates()
     root.mainloop()
 
 
@@ -1273,4 +998,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Los procesos del calendario arrancan este mismo ejecutable.
+    multiprocessing.freeze_support()
     main()
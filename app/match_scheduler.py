@@ -0,0 +1,673 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from itertools import chain, combinations
+import random
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin ella se usa el backend de diccionarios.
+    np = None
+
+BACKENDS = ("python", "numpy")
+MATCHERS = ("auto", "exhaustive", "pruned")
+# Con "auto", por encima de estos jugadores en pista se usa el podado: la
+# tabla de grupos de 4 crece con C(n, 4) (64 en pista: ~7 s y ~140 MB).
+EXHAUSTIVE_LIMIT = 32
+CANDIDATES_PER_ITEM = 8
+IMPROVEMENT_PASSES = 3
+
+
+def build_schedule_report(
+    participants,
+    courts,
+    rounds,
+    shuffle=False,
+    backend=None,
+    matcher="auto",
+    seed=None,
+):
+    data = generate_schedule(
+        participants,
+        courts,
+        rounds,
+        shuffle=shuffle,
+        backend=backend,
+        matcher=matcher,
+        seed=seed,
+    )
+    if data["error"]:
+        return data["error"]
+    return format_schedule(data)
+
+
+def build_schedule_data(
+    participants,
+    courts,
+    rounds,
+    shuffle=False,
+    backend=None,
+    matcher="auto",
+    seed=None,
+):
+    return generate_schedule(
+        participants,
+        courts,
+        rounds,
+        shuffle=shuffle,
+        backend=backend,
+        matcher=matcher,
+        seed=seed,
+    )
+
+
+def default_backend():
+    return "numpy" if np is not None else "python"
+
+
+def generate_schedule(
+    participants,
+    courts,
+    rounds,
+    shuffle=False,
+    backend=None,
+    matcher="auto",
+    seed=None,
+):
+    """Calendario voraz ronda a ronda.
+
+    ``matcher="exhaustive"`` prueba todos los grupos de 4 (el algoritmo de
+    siempre, con ``backend`` python o numpy); ``matcher="pruned"`` elige
+    primero las parejas y luego los cruces con listas de candidatos
+    acotadas, en tiempo casi cuadratico. ``matcher="auto"`` usa el
+    exhaustivo hasta ``EXHAUSTIVE_LIMIT`` jugadores en pista y el podado
+    por encima. Con ``shuffle`` el orden inicial
+    de los jugadores sale de ``random.Random(seed)``: misma semilla, mismo
+    calendario.
+    """
+    if matcher not in MATCHERS:
+        raise ValueError(f"Emparejador desconocido: {matcher}")
+    backend = backend or default_backend()
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconocido: {backend}")
+    if backend == "numpy" and np is None:
+        raise RuntimeError("El backend numpy necesita tener NumPy instalado.")
+    names = list(participants)
+    if shuffle:
+        random.Random(seed).shuffle(names)
+    n = len(names)
+    if n < 4:
+        return {"error": "Se necesitan al menos 4 participantes para generar partidos."}
+    if courts < 1 or rounds < 1:
+        return {"error": "El numero de pistas y rondas debe ser al menos 1."}
+
+    max_matches_per_round = min(courts, n // 4)
+    if max_matches_per_round == 0:
+        return {"error": "No hay suficientes participantes para formar un partido."}
+    if matcher == "auto":
+        play_count = min(max_matches_per_round * 4, (n // 4) * 4)
+        matcher = "exhaustive" if play_count <= EXHAUSTIVE_LIMIT else "pruned"
+    if backend == "numpy" and matcher == "exhaustive":
+        return _generate_schedule_numpy(names, max_matches_per_round, rounds)
+
+    partner_counts = {pair: 0 for pair in combinations(range(n), 2)}
+    opponent_counts = {pair: 0 for pair in combinations(range(n), 2)}
+    team_counts = {pair: 0 for pair in combinations(range(n), 2)}
+    match_counts = {}
+
+    matches_played = [0] * n
+    rests = [0] * n
+    player_logs = {i: [] for i in range(n)}
+    player_rest_rounds = {i: [] for i in range(n)}
+    rounds_out = []
+
+    for round_index in range(1, rounds + 1):
+        missing_by_player = _missing_partner_counts(n, partner_counts)
+        play_slots = max_matches_per_round * 4
+        sorted_players = sorted(
+            range(n),
+            key=lambda i: (-missing_by_player[i], matches_played[i], -rests[i], names[i]),
+        )
+        play_count = min(play_slots, (n // 4) * 4)
+        playing = set(sorted_players[:play_count])
+        remaining = set(playing)
+
+        round_matches = []
+        unmet_exists = any(count == 0 for count in partner_counts.values())
+        scoring = (
+            partner_counts,
+            opponent_counts,
+            team_counts,
+            match_counts,
+            matches_played,
+            rests,
+            unmet_exists,
+        )
+        picks = None
+        if matcher == "pruned":
+            picks = _pruned_round_matches(sorted(playing), scoring)
+
+        while len(remaining) >= 4:
+            if picks is not None:
+                best = picks.pop(0) if picks else None
+            else:
+                best = _best_match(remaining, scoring)
+            if best is None:
+                break
+
+            team1, team2 = best
+            for player in team1 + team2:
+                remaining.remove(player)
+                matches_played[player] += 1
+
+            partner_counts[team1] += 1
+            partner_counts[team2] += 1
+            team_counts[team1] += 1
+            team_counts[team2] += 1
+
+            for a in team1:
+                for b in team2:
+                    opponent_counts[_pair_key(a, b)] += 1
+
+            match_key = _match_key(team1, team2)
+            match_counts[match_key] = match_counts.get(match_key, 0) + 1
+            round_matches.append((team1, team2))
+
+            for player in team1:
+                teammate = team1[0] if team1[1] == player else team1[1]
+                player_logs[player].append((round_index, teammate, team2))
+            for player in team2:
+                teammate = team2[0] if team2[1] == player else team2[1]
+                player_logs[player].append((round_index, teammate, team1))
+
+        resting = sorted(set(range(n)) - playing | remaining)
+        for player in resting:
+            rests[player] += 1
+            player_rest_rounds[player].append(round_index)
+
+        rounds_out.append(
+            {
+                "round": round_index,
+                "matches": round_matches,
+                "resting": resting,
+            }
+        )
+
+    unmet_pairs = [pair for pair, count in partner_counts.items() if count == 0]
+    return {
+        "error": None,
+        "names": names,
+        "rounds": rounds_out,
+        "player_logs": player_logs,
+        "player_rest_rounds": player_rest_rounds,
+        "matches_played": matches_played,
+        "rests": rests,
+        "unmet_pairs": unmet_pairs,
+    }
+
+
+CANDIDATE_BATCH = 8192
+
+# Pares de un grupo ordenado (c0, c1, c2, c3), colocados de forma que cada
+# reparto en parejas use dos columnas seguidas: (0,1)+(2,3), (0,2)+(1,3) y
+# (0,3)+(1,2).
+_GROUP_PAIRS = ((0, 1), (2, 3), (0, 2), (1, 3), (0, 3), (1, 2))
+# Para cada reparto: posicion del compañero de c0 y de la pareja rival.
+_PAIRINGS = ((1, 2, 3), (2, 1, 3), (3, 1, 2))
+
+
+@lru_cache(maxsize=2)
+def _group_tables(size):
+    """Grupos de 4 de ``range(size)`` en orden lexicografico.
+
+    Devuelve ``(grupos, pares, codigos, claves)``: los indices planos
+    ``a*size+b`` de los 6 pares de cada grupo, un codigo creciente para
+    buscar un grupo y la clave de partido de cada uno de sus 3 repartos.
+    """
+    total = size * (size - 1) * (size - 2) * (size - 3) // 24
+    groups = np.fromiter(
+        chain.from_iterable(combinations(range(size), 4)),
+        dtype=np.int32,
+        count=total * 4,
+    ).reshape(-1, 4)
+    pairs = np.empty((total, 6), dtype=np.int32)
+    for column, (x, y) in enumerate(_GROUP_PAIRS):
+        pairs[:, column] = groups[:, x] * size + groups[:, y]
+    wide = groups.astype(np.int64)
+    codes = ((wide[:, 0] * size + wide[:, 1]) * size + wide[:, 2]) * size + wide[:, 3]
+    keys = np.empty((total, 3), dtype=np.int64)
+    for option, (mate, rival_a, rival_b) in enumerate(_PAIRINGS):
+        keys[:, option] = (
+            (wide[:, 0] * size + wide[:, mate]) * size + wide[:, rival_a]
+        ) * size + wide[:, rival_b]
+    for table in (groups, pairs, codes, keys):
+        table.setflags(write=False)
+    return groups, pairs, codes, keys
+
+
+def _rank_candidates(players, tables, match_counts, unmet_exists):
+    """Mejor reparto de cada grupo de 4 de ``players`` y su rango.
+
+    El rango ordena igual que ``_score_match`` (puntuacion x2 para trabajar
+    con enteros) y, a igualdad, prefiere la menor clave de partido, como el
+    bucle original. ``players`` va ordenado, asi que comparar claves con
+    indices locales equivale a compararlas con los globales.
+    """
+    team_values, opponent_values, new_partners, balance, _n = tables
+    size = len(players)
+    local_groups, local_pairs, codes, keys = _group_tables(size)
+    block = np.ix_(players, players)
+    team_pairs = team_values[block].ravel().take(local_pairs)
+    opponents = opponent_values[block].ravel().take(local_pairs)
+    player_balance = balance[players].take(local_groups)
+    # Sumas columna a columna: mucho mas rapidas que ``sum(axis=1)`` con 6 columnas.
+    base = opponents[:, 0] + opponents[:, 1]
+    for column in range(2, 6):
+        base += opponents[:, column]
+    for column in range(4):
+        base += player_balance[:, column]
+    scores = team_pairs[:, 0::2] + team_pairs[:, 1::2]
+    scores += base[:, None]
+    if unmet_exists:
+        fresh = new_partners[block].ravel().take(local_pairs)
+        scores -= 80 * ((fresh[:, 0::2] | fresh[:, 1::2]) == 0)
+
+    if match_counts:
+        position = {player: index for index, player in enumerate(players.tolist())}
+        for (team1, team2), count in match_counts.items():
+            members = team1 + team2
+            if any(player not in position for player in members):
+                continue
+            local = sorted(position[player] for player in members)
+            code = ((local[0] * size + local[1]) * size + local[2]) * size + local[3]
+            row = int(np.searchsorted(codes, code))
+            option = (1, 2, 3).index(sorted(members).index(team1[1]))
+            scores[row, option] -= 60 * count
+
+    # Dentro de un grupo los repartos ya van en orden de clave: argmax se
+    # queda con el primero de los empatados.
+    options = scores.argmax(axis=1)
+    rows = np.arange(len(scores))
+    span = size**4
+    ranks = scores[rows, options] * span + (span - 1 - keys[rows, options])
+    return players[local_groups], ranks, options
+
+
+def _pick_round_matches(playing, tables, match_counts, unmet_exists):
+    """Repite la eleccion voraz de ``generate_schedule`` sobre una ronda.
+
+    Dentro de una ronda las puntuaciones no cambian (cada partido elegido
+    solo toca pares de jugadores que ya no quedan), asi que se puntuan
+    todos los grupos una vez y se recorren de mejor a peor, por tandas,
+    saltando los que contienen a jugadores ya colocados.
+    """
+    groups, ranks, options = _rank_candidates(
+        np.array(sorted(playing), dtype=np.int64), tables, match_counts, unmet_exists
+    )
+    alive = np.arange(len(ranks))
+    placed = np.zeros(tables[-1], dtype=bool)
+    chosen = set()
+    picks = []
+    while len(chosen) < len(playing) and len(alive):
+        take = min(CANDIDATE_BATCH, len(alive))
+        if take < len(alive):
+            top = alive[np.argpartition(-ranks[alive], take - 1)[:take]]
+        else:
+            top = alive
+        top = top[np.argsort(-ranks[top], kind="stable")]
+        for group, option in zip(groups[top].tolist(), options[top].tolist()):
+            if not chosen.isdisjoint(group):
+                continue
+            mate, rival_a, rival_b = _PAIRINGS[option]
+            picks.append(((group[0], group[mate]), (group[rival_a], group[rival_b])))
+            chosen.update(group)
+            placed[group] = True
+            if len(chosen) == len(playing):
+                break
+        members = groups[alive]
+        taken = placed.take(members[:, 0])
+        for column in range(1, 4):
+            taken |= placed.take(members[:, column])
+        alive = alive[~taken]
+    return picks
+
+
+def _generate_schedule_numpy(names, max_matches_per_round, rounds):
+    n = len(names)
+    partner_counts = np.zeros((n, n), dtype=np.int64)
+    opponent_counts = np.zeros((n, n), dtype=np.int64)
+    team_counts = np.zeros((n, n), dtype=np.int64)
+    match_counts = {}
+
+    matches_played = np.zeros(n, dtype=np.int64)
+    rests = np.zeros(n, dtype=np.int64)
+    player_logs = {i: [] for i in range(n)}
+    player_rest_rounds = {i: [] for i in range(n)}
+    rounds_out = []
+    unmet_mask = ~np.eye(n, dtype=bool)
+
+    for round_index in range(1, rounds + 1):
+        new_partners = (partner_counts == 0) & unmet_mask
+        missing_by_player = new_partners.sum(axis=1).tolist()
+        played_list = matches_played.tolist()
+        rests_list = rests.tolist()
+        play_slots = max_matches_per_round * 4
+        sorted_players = sorted(
+            range(n),
+            key=lambda i: (-missing_by_player[i], played_list[i], -rests_list[i], names[i]),
+        )
+        play_count = min(play_slots, (n // 4) * 4)
+        playing = set(sorted_players[:play_count])
+        unmet_exists = bool(new_partners.any())
+        opponent_values = np.where(opponent_counts == 0, 20, -4)
+
+        tables = (
+            200 * new_partners - 10 * partner_counts - 30 * team_counts - opponent_values,
+            opponent_values,
+            new_partners,
+            rests - matches_played,
+            n,
+        )
+        round_matches = []
+        for team1, team2 in _pick_round_matches(
+            playing, tables, match_counts, unmet_exists
+        ):
+            for player in team1 + team2:
+                matches_played[player] += 1
+            for a, b in (team1, team2):
+                partner_counts[a, b] += 1
+                partner_counts[b, a] += 1
+                team_counts[a, b] += 1
+                team_counts[b, a] += 1
+            for a in team1:
+                for b in team2:
+                    opponent_counts[a, b] += 1
+                    opponent_counts[b, a] += 1
+
+            match_key = _match_key(team1, team2)
+            match_counts[match_key] = match_counts.get(match_key, 0) + 1
+            round_matches.append((team1, team2))
+
+            for player in team1:
+                teammate = team1[0] if team1[1] == player else team1[1]
+                player_logs[player].append((round_index, teammate, team2))
+            for player in team2:
+                teammate = team2[0] if team2[1] == player else team2[1]
+                player_logs[player].append((round_index, teammate, team1))
+
+        resting = sorted(set(range(n)) - playing)
+        for player in resting:
+            rests[player] += 1
+            player_rest_rounds[player].append(round_index)
+
+        rounds_out.append(
+            {
+                "round": round_index,
+                "matches": round_matches,
+                "resting": resting,
+            }
+        )
+
+    unmet_pairs = [
+        (int(a), int(b)) for a, b in np.argwhere(np.triu(partner_counts == 0, 1))
+    ]
+    return {
+        "error": None,
+        "names": names,
+        "rounds": rounds_out,
+        "player_logs": player_logs,
+        "player_rest_rounds": player_rest_rounds,
+        "matches_played": matches_played.tolist(),
+        "rests": rests.tolist(),
+        "unmet_pairs": unmet_pairs,
+    }
+
+
+def format_schedule(data):
+    names = data["names"]
+    lines = []
+    for round_data in data["rounds"]:
+        lines.append(f"Ronda {round_data['round']}")
+        if round_data["matches"]:
+            for idx, match in enumerate(round_data["matches"], 1):
+                team1, team2 = match
+                team1_names = f"{names[team1[0]]} + {names[team1[1]]}"
+                team2_names = f"{names[team2[0]]} + {names[team2[1]]}"
+                lines.append(f"- Partido {idx}: ({team1_names}) vs ({team2_names})")
+        else:
+            lines.append("- Sin partidos")
+
+        if round_data["resting"]:
+            rest_names = ", ".join(names[i] for i in round_data["resting"])
+            lines.append(f"- Descansan: {rest_names}")
+        else:
+            lines.append("- Descansan: nadie")
+        lines.append("")
+
+    lines.append("Resumen jugadores")
+    for idx, name in enumerate(names):
+        lines.append(
+            f"- {name}: juega {data['matches_played'][idx]} partidos; "
+            f"descansa {data['rests'][idx]} rondas."
+        )
+
+    if data["unmet_pairs"]:
+        lines.append("")
+        lines.append(
+            "Aviso: no se pudo completar todas las parejas unicas con las rondas indicadas."
+        )
+
+    return "\n".join(lines)
+
+
+def _best_match(remaining, scoring):
+    best = None
+    best_score = None
+    for combo in combinations(sorted(remaining), 4):
+        pairings = (
+            ((combo[0], combo[1]), (combo[2], combo[3])),
+            ((combo[0], combo[2]), (combo[1], combo[3])),
+            ((combo[0], combo[3]), (combo[1], combo[2])),
+        )
+        for team1, team2 in pairings:
+            team1 = tuple(sorted(team1))
+            team2 = tuple(sorted(team2))
+            score = _score_match(team1, team2, *scoring)
+            match_key = _match_key(team1, team2)
+            tie_break = (match_key[0], match_key[1])
+            if best_score is None or score > best_score:
+                best = (team1, team2, tie_break)
+                best_score = score
+            elif score == best_score and best is not None:
+                if tie_break < best[2]:
+                    best = (team1, team2, tie_break)
+    if best is None:
+        return None
+    return best[0], best[1]
+
+
+def _pair_items(items, weight, candidates=CANDIDATES_PER_ITEM):
+    """Empareja ``items`` (numero par) intentando maximizar ``weight``.
+
+    Cada elemento solo mira sus ``candidates`` mejores opciones; con esas
+    aristas se hace un emparejamiento voraz, los que se quedan sueltos se
+    emparejan entre si y al final se prueban intercambios 2-opt entre
+    parejas. Todo es O(n^2) salvo la ordenacion de aristas.
+    """
+    items = sorted(items)
+    edges = {}
+    for index, item in enumerate(items):
+        ranked = sorted(
+            ((weight(item, other), other) for other in items if other != item),
+            key=lambda entry: (-entry[0], entry[1]),
+        )
+        for value, other in ranked[:candidates]:
+            edge = (item, other) if item < other else (other, item)
+            edges[edge] = value
+
+    pairs = []
+    used = set()
+    for (a, b), _value in sorted(edges.items(), key=lambda entry: (-entry[1], entry[0])):
+        if a in used or b in used:
+            continue
+        pairs.append((a, b))
+        used.update((a, b))
+
+    loose = [item for item in items if item not in used]
+    while len(loose) >= 2:
+        first = loose.pop(0)
+        partner = max(loose, key=lambda other: weight(first, other))
+        loose.remove(partner)
+        pairs.append((first, partner))
+
+    for _pass in range(IMPROVEMENT_PASSES):
+        improved = False
+        for i in range(len(pairs)):
+            for j in range(i + 1, len(pairs)):
+                a, b = pairs[i]
+                c, d = pairs[j]
+                current = weight(a, b) + weight(c, d)
+                for first, second in (((a, c), (b, d)), ((a, d), (b, c))):
+                    value = weight(*first) + weight(*second)
+                    if value > current:
+                        pairs[i], pairs[j] = first, second
+                        current = value
+                        improved = True
+        if not improved:
+            break
+    return pairs
+
+
+def _pruned_round_matches(players, scoring):
+    """Partidos de una ronda en dos pasos: parejas y despues cruces."""
+    partner_counts, opponent_counts, team_counts, match_counts = scoring[:4]
+
+    def team_weight(a, b):
+        key = _pair_key(a, b)
+        partners = partner_counts[key]
+        return int(partners == 0) * 100 - partners * 5 - team_counts[key] * 15
+
+    teams = [_pair_key(a, b) for a, b in _pair_items(players, team_weight)]
+
+    def match_weight(team1, team2):
+        value = 0
+        for a in team1:
+            for b in team2:
+                value += 10 if opponent_counts[_pair_key(a, b)] == 0 else -2
+        return value - match_counts.get(_match_key(team1, team2), 0) * 30
+
+    matches = [_match_key(team1, team2) for team1, team2 in _pair_items(teams, match_weight)]
+    # Los mejores partidos primero, como los iria eligiendo el voraz.
+    matches.sort(key=lambda match: (-_score_match(match[0], match[1], *scoring), match))
+    return matches
+
+
+def score_schedule(data):
+    """Suma de ``_score_match`` de cada partido en el momento de jugarlo.
+
+    Sirve para comparar emparejadores sobre el mismo criterio que usa el
+    voraz exhaustivo.
+    """
+    n = len(data["names"])
+    partner_counts = {pair: 0 for pair in combinations(range(n), 2)}
+    opponent_counts = {pair: 0 for pair in combinations(range(n), 2)}
+    team_counts = {pair: 0 for pair in combinations(range(n), 2)}
+    match_counts = {}
+    matches_played = [0] * n
+    rests = [0] * n
+    total = 0
+    for round_data in data["rounds"]:
+        unmet_exists = any(count == 0 for count in partner_counts.values())
+        for team1, team2 in round_data["matches"]:
+            team1 = tuple(sorted(team1))
+            team2 = tuple(sorted(team2))
+            total += _score_match(
+                team1,
+                team2,
+                partner_counts,
+                opponent_counts,
+                team_counts,
+                match_counts,
+                matches_played,
+                rests,
+                unmet_exists,
+            )
+            for player in team1 + team2:
+                matches_played[player] += 1
+            partner_counts[team1] += 1
+            partner_counts[team2] += 1
+            team_counts[team1] += 1
+            team_counts[team2] += 1
+            for a in team1:
+                for b in team2:
+                    opponent_counts[_pair_key(a, b)] += 1
+            match_key = _match_key(team1, team2)
+            match_counts[match_key] = match_counts.get(match_key, 0) + 1
+        for player in round_data["resting"]:
+            rests[player] += 1
+    return total
+
+
+def _pair_key(a, b):
+    return (a, b) if a < b else (b, a)
+
+
+def _match_key(team1, team2):
+    return (team1, team2) if team1 < team2 else (team2, team1)
+
+
+def _missing_partner_counts(n, partner_counts):
+    missing = [0] * n
+    for i in range(n):
+        for j in range(i + 1, n):
+            if partner_counts[(i, j)] == 0:
+                missing[i] += 1
+                missing[j] += 1
+    return missing
+
+
+def _score_match(
+    team1,
+    team2,
+    partner_counts,
+    opponent_counts,
+    team_counts,
+    match_counts,
+    matches_played,
+    rests,
+    unmet_exists,
+):
+    new_partner = int(partner_counts[team1] == 0) + int(partner_counts[team2] == 0)
+    partner_repeat = partner_counts[team1] + partner_counts[team2]
+
+    new_opponent = 0
+    opponent_repeat = 0
+    for a in team1:
+        for b in team2:
+            if opponent_counts[_pair_key(a, b)] == 0:
+                new_opponent += 1
+            else:
+                opponent_repeat += 1
+
+    team_repeat = team_counts[team1] + team_counts[team2]
+    match_repeat = match_counts.get(_match_key(team1, team2), 0)
+    balance = sum(rests[p] - matches_played[p] for p in team1 + team2)
+
+    score = (
+        new_partner * 100
+        + new_opponent * 10
+        + balance * 0.5
+        - opponent_repeat * 2
+        - partner_repeat * 5
+        - team_repeat * 15
+        - match_repeat * 30
+    )
+    if unmet_exists and new_partner == 0:
+        score -= 40
+    return score
+
+
+if __name__ == "__main__":
+    sample_players = ["Ana", "Beto", "Carla", "Dani", "Eva", "Fran", "Gema", "Hugo"]
+    report = build_schedule_report(sample_players, courts=2, rounds=3)
+    print(report)
@@ -1,5 +1,5 @@
-﻿import copy
-import json
+﻿import atexit
+import multiprocessing
 import os
 import socket
 import sys
@@ -8,33 +8,27 @@ import time
 
 from PIL import Image
 import qrcode
-from flask import Flask, jsonify, render_template, request
+
+from live_state import (
+    get_current_ranking,
+    get_current_tournament,
+    get_current_version,
+    wait_for_change,
+)
+from scheduler import warm_executor
+from server import WebServer
+from standings import (
+    build_scoreboard_rows,
+    compute_player_stats,
+    get_active_round_index,
+)
+from webapp import SCHEDULES_DIR, TOURNAMENTS_DIR, create_app
 
 pygame = None
 
 __version__ = "1.1.1"
 
 WEB_PORT = 5050
-TOURNAMENTS_DIR = os.path.join(os.path.dirname(__file__), "Torneos")
-_state_lock = threading.Lock()
-_tournament_state = {"data": None, "version": 0}
-
-
-def set_current_tournament(data):
-    with _state_lock:
-        _tournament_state["data"] = copy.deepcopy(data)
-        _tournament_state["version"] += 1
-
-
-def clear_current_tournament():
-    with _state_lock:
-        _tournament_state["data"] = None
-        _tournament_state["version"] += 1
-
-
-def get_current_tournament():
-    with _state_lock:
-        return copy.deepcopy(_tournament_state["data"]), _tournament_state["version"]
 
 
 def slugify_name(name):
@@ -45,15 +39,6 @@ def slugify_name(name):
     return cleaned.lower()
 
 
-def validate_filename(name):
-    invalid_chars = '<>:"/\\|?*'
-    if not name or name in (".", ".."): 
-        return False
-    if name.endswith(" ") or name.endswith("."):
-        return False
-    return not any(ch in invalid_chars for ch in name)
-
-
 def get_local_ip():
     ip = "127.0.0.1"
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -68,190 +53,19 @@ def get_local_ip():
 
 
 def start_web_server():
-    app = Flask(__name__, template_folder="web/templates")
-
-    @app.route("/")
-    def index():
-        return render_template("home.html")
-
-    @app.route("/nuevo")
-    def new_tournament():
-        return render_template("index.html")
-
-    @app.route("/abrir")
-    def open_tournament():
-        return render_template("open.html")
-
-    @app.route("/results/<tournament_id>")
-    def results(tournament_id):
-        path = os.path.join(TOURNAMENTS_DIR, f"{tournament_id}.json")
-        if not os.path.exists(path):
-            return "Torneo no encontrado", 404
-        with open(path, "r", encoding="utf-8") as file:
-            data = json.load(file)
-        set_current_tournament(data)
-        return render_template("results.html", tournament=data)
-
-    @app.route("/clasificacion")
-    def ranking():
-        tournament, _version = get_current_tournament()
-        return render_template("ranking.html", tournament=tournament)
-
-    @app.route("/api/tournaments", methods=["POST"])
-    def create_tournament():
-        payload = request.get_json(silent=True)
-        if not payload:
-            return jsonify({"error": "Payload invalido"}), 400
-
-        requested_name = payload.get("name", "").strip()
-        if not requested_name:
-            requested_name = time.strftime("%Y%m%d%H%M%S")
-        if not validate_filename(requested_name):
-            return jsonify({"error": "Nombre de torneo invalido"}), 400
-        tournament_id = requested_name
-        os.makedirs(TOURNAMENTS_DIR, exist_ok=True)
-        path = os.path.join(TOURNAMENTS_DIR, f"{tournament_id}.json")
-        if os.path.exists(path):
-            return jsonify({"error": "Nombre de torneo existente"}), 409
-        data = {
-            "id": tournament_id,
-            "name": requested_name,
-            "rounds_count": payload.get("rounds_count"),
-            "courts": payload.get("courts"),
-            "players": payload.get("players", []),
-            "rounds": payload.get("rounds", []),
-        }
-        with open(path, "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=2)
-        set_current_tournament(data)
-        return jsonify({"id": tournament_id, "redirect": f"/results/{tournament_id}"})
-
-    @app.route("/api/tournaments/exists")
-    def tournament_exists():
-        name = request.args.get("name", "").strip()
-        if not name:
-            return jsonify({"exists": False})
-        if not validate_filename(name):
-            return jsonify({"exists": False})
-        path = os.path.join(TOURNAMENTS_DIR, f"{name}.json")
-        return jsonify({"exists": os.path.exists(path)})
-
-    @app.route("/api/ping")
-    def ping():
-        return jsonify({"status": "ok"})
-
-    @app.route("/api/current/clear", methods=["POST"])
-    def clear_current():
-        clear_current_tournament()
-        return jsonify({"status": "ok"})
-
-    @app.route("/api/tournaments/list")
-    def list_tournaments():
-        os.makedirs(TOURNAMENTS_DIR, exist_ok=True)
-        tournaments_path = os.path.abspath(TOURNAMENTS_DIR)
-        print(f"Leo los torneos de la ubicacion: {tournaments_path}")
-        items = []
-        for filename in os.listdir(TOURNAMENTS_DIR):
-            if not filename.endswith(".json"):
-                continue
-            path = os.path.join(TOURNAMENTS_DIR, filename)
-            try:
-                with open(path, "r", encoding="utf-8") as file:
-                    data = json.load(file)
-            except (OSError, json.JSONDecodeError):
-                continue
-            rounds = data.get("rounds", []) or []
-            total_rounds = len(rounds)
-            completed_rounds = 0
-            for round_info in rounds:
-                matches = round_info.get("matches", []) or []
-                if not matches:
-                    continue
-                all_done = True
-                for match in matches:
-                    result = match.get("result") or {}
-                    score_a = result.get("teamA")
-                    score_b = result.get("teamB")
-                    if not isinstance(score_a, int) or not isinstance(score_b, int):
-                        all_done = False
-                        break
-                if all_done:
-                    completed_rounds += 1
-            is_finished = total_rounds > 0 and completed_rounds >= total_rounds
-            file_base = filename.replace(".json", "")
-            items.append(
-                {
-                    "id": data.get("id") or file_base,
-                    "name": file_base,
-                    "completed_rounds": completed_rounds,
-                    "total_rounds": total_rounds,
-                    "finished": is_finished,
-                }
-            )
-        items.sort(key=lambda item: (item["finished"], item["name"].lower()))
-        return jsonify({"tournaments": items})
-
-    @app.route("/api/tournaments/<tournament_id>/open", methods=["POST"])
-    def open_tournament_api(tournament_id):
-        path = os.path.join(TOURNAMENTS_DIR, f"{tournament_id}.json")
-        if not os.path.exists(path):
-            return jsonify({"error": "Torneo no encontrado"}), 404
-        with open(path, "r", encoding="utf-8") as file:
-            data = json.load(file)
-        set_current_tournament(data)
-        return jsonify({"status": "ok", "redirect": f"/results/{tournament_id}"})
-
-    @app.route("/api/tournaments/<tournament_id>", methods=["DELETE"])
-    def delete_tournament(tournament_id):
-        path = os.path.join(TOURNAMENTS_DIR, f"{tournament_id}.json")
-        if not os.path.exists(path):
-            return jsonify({"error": "Torneo no encontrado"}), 404
-        try:
-            os.remove(path)
-        except OSError:
-            return jsonify({"error": "No se pudo borrar"}), 500
-        current, _version = get_current_tournament()
-        if current and current.get("id") == tournament_id:
-            clear_current_tournament()
-        return jsonify({"status": "ok"})
-
-    @app.route("/api/tournaments/<tournament_id>/results", methods=["POST"])
-    def update_results(tournament_id):
-        payload = request.get_json(silent=True)
-        if not payload:
-            return jsonify({"error": "Payload invalido"}), 400
-
-        path = os.path.join(TOURNAMENTS_DIR, f"{tournament_id}.json")
-        if not os.path.exists(path):
-            return jsonify({"error": "Torneo no encontrado"}), 404
-
-        round_index = payload.get("round_index")
-        match_index = payload.get("match_index")
-        result = payload.get("result", {})
-
-        if round_index is None or match_index is None:
-            return jsonify({"error": "Indices invalidos"}), 400
-
-        with open(path, "r", encoding="utf-8") as file:
-            data = json.load(file)
-
-        try:
-            match = data["rounds"][round_index]["matches"][match_index]
-        except (IndexError, KeyError, TypeError):
-            return jsonify({"error": "Partido no encontrado"}), 404
-
-        match["result"] = {
-            "teamA": result.get("teamA"),
-            "teamB": result.get("teamB"),
-        }
-
-        with open(path, "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=2)
-
-        set_current_tournament(data)
-        return jsonify({"status": "ok"})
-
-    app.run(host="0.0.0.0", port=WEB_PORT, debug=False, use_reloader=False)
+    app = create_app(
+        {"tournaments_dir": TOURNAMENTS_DIR, "schedules_dir": SCHEDULES_DIR}
+    )
+    state = app.extensions["torneos"]
+    warm_executor()
+    atexit.register(state["repository"].close)
+    atexit.register(state["schedule_jobs"].close)
+    # Modo, hilos y keep-alive salen de GTR_SERVER* (ver server.py).
+    server = WebServer(app, "0.0.0.0", WEB_PORT)
+    server.on_shutdown(state["broker"].close)
+    # atexit va en orden inverso: se vacia el servidor antes de guardar.
+    atexit.register(server.shutdown)
+    server.serve_forever()
 
 
 def _hex_to_rgb(value):
@@ -316,118 +130,6 @@ class TextCache:
         return surf
 
 
-def compute_player_stats(tournament):
-    stats = {}
-    for player in tournament.get("players", []):
-        stats[player] = {
-            "wins": 0,
-            "losses": 0,
-            "played": 0,
-            "points_for": 0,
-            "points_against": 0,
-        }
-    for round_info in tournament.get("rounds", []):
-        for match in round_info.get("matches", []):
-            result = match.get("result") or {}
-            score_a = result.get("teamA")
-            score_b = result.get("teamB")
-            if not isinstance(score_a, int) or not isinstance(score_b, int):
-                continue
-            team_a = match.get("teams", [[], []])[0]
-            team_b = match.get("teams", [[], []])[1]
-            team_a_wins = score_a > score_b
-            team_b_wins = score_b > score_a
-
-            for player in team_a:
-                stats.setdefault(
-                    player,
-                    {
-                        "wins": 0,
-                        "losses": 0,
-                        "played": 0,
-                        "points_for": 0,
-                        "points_against": 0,
-                    },
-                )
-                entry = stats[player]
-                entry["played"] += 1
-                entry["points_for"] += score_a
-                entry["points_against"] += score_b
-                if team_a_wins:
-                    entry["wins"] += 1
-                elif team_b_wins:
-                    entry["losses"] += 1
-
-            for player in team_b:
-                stats.setdefault(
-                    player,
-                    {
-                        "wins": 0,
-                        "losses": 0,
-                        "played": 0,
-                        "points_for": 0,
-                        "points_against": 0,
-                    },
-                )
-                entry = stats[player]
-                entry["played"] += 1
-                entry["points_for"] += score_b
-                entry["points_against"] += score_a
-                if team_b_wins:
-                    entry["wins"] += 1
-                elif team_a_wins:
-                    entry["losses"] += 1
-    return stats
-
-
-def build_scoreboard_rows(stats):
-    def _scoreboard_sort_key(item):
-        player, stat = item
-        return (
-            -stat["wins"],
-            stat["losses"],
-            -(stat["points_for"] - stat["points_against"]),
-            -stat["points_for"],
-            player.lower(),
-        )
-
-    sorted_stats = sorted(stats.items(), key=_scoreboard_sort_key)
-    rows = []
-    for row_index, (player, stat) in enumerate(sorted_stats, start=1):
-        rows.append(
-            [
-                row_index,
-                player,
-                stat["wins"],
-                stat["losses"],
-                stat["played"],
-                stat["points_for"],
-                stat["points_against"],
-            ]
-        )
-    return rows
-
-
-def get_active_round_index(rounds):
-    if not rounds:
-        return None
-    for index, round_info in enumerate(rounds):
-        matches = round_info.get("matches", []) or []
-        if not matches:
-            return index
-        all_done = True
-        for match in matches:
-            result = match.get("result") or {}
-            score_a = result.get("teamA")
-            score_b = result.get("teamB")
-            if not isinstance(score_a, int) or not isinstance(score_b, int):
-                all_done = False
-                break
-        if not all_done:
-            return index
-    return len(rounds) - 1
-
-
 def pil_to_surface(image):
     if image.mode not in ("RGB", "RGBA"):
         image = image.convert("RGBA")
@@ -884,8 +586,9 @@ def draw_scoreboard_panel(screen, cache, fonts, layout, state, panel_rect, tourn
     )
     draw_rect(screen, CARD_BG, card_rect, BORDER_LIGHT, 1)
 
-    stats = compute_player_stats(tournament)
-    rows = build_scoreboard_rows(stats)
+    rows = state.get("ranking")
+    if rows is None:
+        rows = build_scoreboard_rows(compute_player_stats(tournament))
 
     header_h = layout["score_header_h"]
     row_h = layout["score_row_h"]
@@ -1122,6 +825,15 @@ def _init_display():
     raise RuntimeError(f"No se pudo inicializar la ventana de Pygame: {last_error}")
 
 
+def _watch_tournament_updates(event_type, version):
+    while True:
+        _tournament, version = wait_for_change(version)
+        try:
+            pygame.event.post(pygame.event.Event(event_type))
+        except pygame.error:
+            return
+
+
 def start_gui():
     ip = get_local_ip()
     url = f"http://{ip}:{WEB_PORT}"
@@ -1145,6 +857,7 @@ def start_gui():
         "display": "qr",
         "last_version": -1,
         "tournament": None,
+        "ranking": None,
         "rounds_scroll": 0,
         "rounds_max_scroll": 0,
         "rounds_auto_scroll": True,
@@ -1155,10 +868,42 @@ def start_gui():
         "scoreboard_card_rect": pygame.Rect(0, 0, 0, 0),
     }
 
+    tournament_event = pygame.event.custom_type()
+    threading.Thread(
+        target=_watch_tournament_updates,
+        args=(tournament_event, state["last_version"]),
+        daemon=True,
+    ).start()
+
     clock = pygame.time.Clock()
     running = True
+    needs_redraw = True
     while running:
-        for event in pygame.event.get():
+        if get_current_version() != state["last_version"]:
+            tournament, version = get_current_tournament()
+            state["last_version"] = version
+            state["tournament"] = tournament
+            state["ranking"] = get_current_ranking()
+            if tournament:
+                state["display"] = "dashboard"
+                state["rounds_auto_scroll"] = True
+                state["scoreboard_scroll"] = 0
+            else:
+                state["display"] = "qr"
+            needs_redraw = True
+
+        if needs_redraw:
+            if state["display"] == "dashboard" and state["tournament"] is not None:
+                draw_dashboard(screen, cache, fonts, layout, state, assets, state["tournament"])
+            else:
+                draw_qr_screen(screen, cache, fonts, layout, assets, url)
+            pygame.display.flip()
+            needs_redraw = False
+        clock.tick(30)
+
+        # Sin eventos ni cambios de torneo el bucle queda dormido aqui.
+        for event in [pygame.event.wait()] + pygame.event.get():
+            needs_redraw = True
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
@@ -1171,24 +916,6 @@ def start_gui():
                 elif state["scoreboard_card_rect"].collidepoint(mx, my):
                     state["scoreboard_scroll"] -= event.y * scroll_step
 
-        tournament, version = get_current_tournament()
-        if tournament and version != state["last_version"]:
-            state["last_version"] = version
-            state["tournament"] = tournament
-            state["display"] = "dashboard"
-            state["rounds_auto_scroll"] = True
-            state["scoreboard_scroll"] = 0
-        elif not tournament:
-            state["display"] = "qr"
-
-        if state["display"] == "dashboard" and state["tournament"] is not None:
-            draw_dashboard(screen, cache, fonts, layout, state, assets, state["tournament"])
-        else:
-            draw_qr_screen(screen, cache, fonts, layout, assets, url)
-
-        pygame.display.flip()
-        clock.tick(30)
-
     pygame.quit()
 
 
@@ -1287,4 +1014,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Los procesos del calendario arrancan este mismo ejecutable.
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,305 @@
+import copy
+import os
+import threading
+import time
+from contextlib import ExitStack
+
+from locks import LockManager
+from standings import StandingsEngine
+from storage import apply_result
+
+FLUSH_DELAY = 1.0
+
+
+class VersionConflict(Exception):
+    """Algun partido cambio despues de la version que conocia el cliente."""
+
+    def __init__(self, matches, version):
+        super().__init__(matches)
+        self.matches = matches
+        self.version = version
+
+
+class TournamentRepository:
+    """Torneos ya parseados en memoria con escritura diferida a disco.
+
+    Las lecturas se sirven desde memoria y cada resultado solo marca el
+    torneo como sucio; un hilo de fondo lo persiste pasados ``flush_delay``
+    segundos (o al cerrar). Con ``flush_delay <= 0`` se escribe al momento,
+    antes de responder; si no, un resultado se confirma al cliente antes de
+    estar en disco y una caida dentro de esa ventana lo pierde.
+
+    Cada torneo tiene su cerrojo en ``locks`` (ver ``lock``); ``_lock``
+    solo protege los diccionarios internos y nunca se toma antes que uno de
+    torneo. La escritura a disco se hace con ``flush:<id>``, que se toma
+    antes de soltar el del torneo para que las copias lleguen en orden.
+    """
+
+    def __init__(self, storage, flush_delay=FLUSH_DELAY, locks=None):
+        self.storage = storage
+        self.flush_delay = flush_delay
+        self.locks = locks or LockManager()
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._cache = {}
+        self._dirty = {}
+        self._standings = {}
+        self._closed = False
+        self._thread = None
+        self._listeners = []
+        self._flush_listeners = []
+
+    def add_listener(self, listener):
+        """``listener(tournament_id, data, changes)`` tras cada cambio.
+
+        Se llama con el cerrojo del torneo tomado, asi los avisos salen en el
+        mismo orden que las versiones. ``changes`` es una lista de
+        ``(round_index, match_index, resultado_anterior)``, o ``None`` si
+        ha cambiado el torneo entero (jugadores o rondas).
+        """
+        self._listeners.append(listener)
+
+    def add_flush_listener(self, listener):
+        """``listener(tournament_id)`` despues de escribir a disco sus cambios."""
+        self._flush_listeners.append(listener)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="tournament-flusher", daemon=True
+            )
+            self._thread.start()
+
+    def exists(self, tournament_id):
+        with self._lock:
+            if tournament_id in self._cache:
+                return True
+        return self.storage.exists(tournament_id)
+
+    def get(self, tournament_id, cache=True):
+        with self._lock:
+            data = self._cache.get(tournament_id)
+            if data is not None:
+                return data
+        data = self.storage.load(tournament_id)
+        if data is None or not cache:
+            return data
+        with self._lock:
+            # Otro hilo pudo cargarlo mientras leiamos el disco.
+            return self._cache.setdefault(tournament_id, data)
+
+    def lock(self, tournament_id):
+        """Cerrojo (reentrante) del torneo, para cargar-cambiar-guardar-avisar."""
+        return self.locks.hold(tournament_id)
+
+    def _write_lock(self, tournament_id):
+        return self.locks.hold(f"flush:{tournament_id}")
+
+    def create(self, tournament_id, data):
+        with self.lock(tournament_id), self._write_lock(tournament_id):
+            self.storage.save(tournament_id, data)
+            with self._lock:
+                self._cache[tournament_id] = data
+                self._dirty.pop(tournament_id, None)
+                self._standings.pop(tournament_id, None)
+        return data
+
+    def _standings_locked(self, tournament_id, data):
+        # Con el cerrojo del torneo tomado.
+        with self._lock:
+            engine = self._standings.get(tournament_id)
+            if engine is None:
+                engine = StandingsEngine(data)
+                self._standings[tournament_id] = engine
+            return engine
+
+    def ranking(self, tournament_id):
+        """Filas de la clasificacion, ordenadas como ``build_scoreboard_rows``.
+
+        Se calculan una vez por torneo y despues se mantienen partido a
+        partido; la lista devuelta no debe modificarse.
+        """
+        data = self.get(tournament_id)
+        if data is None:
+            return None
+        with self.lock(tournament_id):
+            return self._standings_locked(tournament_id, data).rows()
+
+    def update_results(self, tournament_id, patches):
+        """Aplica varios resultados de golpe: o todos o ninguno.
+
+        ``patches`` es una lista de ``(round_index, match_index, resultado,
+        version_esperada)``. Si algun partido cambio despues de su version
+        esperada se lanza ``VersionConflict`` sin tocar nada. El lote entero
+        comparte una sola version nueva, un aviso y una escritura.
+        """
+        data = self.get(tournament_id)
+        if data is None:
+            raise KeyError(tournament_id)
+        with self.lock(tournament_id):
+            conflicts = []
+            for round_index, match_index, result, expected in patches:
+                if round_index < 0 or match_index < 0:
+                    raise IndexError(round_index if round_index < 0 else match_index)
+                match = data["rounds"][round_index]["matches"][match_index]
+                if not isinstance(result, dict):
+                    raise TypeError("result")
+                # Cambios en otros partidos se mezclan sin mas; solo choca si
+                # este partido cambio despues y a otro resultado.
+                if (
+                    expected is not None
+                    and match.get("version", 0) > expected
+                    and (match.get("result") or {})
+                    != {"teamA": result.get("teamA"), "teamB": result.get("teamB")}
+                ):
+                    conflicts.append((round_index, match_index))
+            if conflicts:
+                raise VersionConflict(conflicts, data.get("version", 0))
+            engine = self._standings_locked(tournament_id, data)
+            version = data.get("version", 0) + 1
+            changes = []
+            for round_index, match_index, result, _expected in patches:
+                match = data["rounds"][round_index]["matches"][match_index]
+                previous = dict(match.get("result") or {})
+                match = apply_result(data, round_index, match_index, result, version)
+                engine.update_match(round_index, match_index, match)
+                changes.append((round_index, match_index, previous))
+            data["version"] = version
+            for listener in self._listeners:
+                listener(tournament_id, data, changes)
+            with self._lock:
+                entry = self._dirty.setdefault(
+                    tournament_id, {"since": time.monotonic(), "matches": set()}
+                )
+                entry["matches"].update(
+                    (round_index, match_index)
+                    for round_index, match_index, _p in changes
+                )
+                write_through = self.flush_delay <= 0 or self._closed
+                if not write_through:
+                    self._ensure_thread()
+                    self._wakeup.notify_all()
+            if write_through:
+                self.flush(tournament_id)
+        return data
+
+    def replace_rounds(self, tournament_id, players, first_round, rounds):
+        """Cambia los jugadores y sustituye las rondas desde ``first_round``.
+
+        Las rondas sustituidas no pueden tener resultados (``ValueError``).
+        Se guarda el torneo completo al momento, con lo que queden por
+        escribir los resultados pendientes.
+        """
+        data = self.get(tournament_id)
+        if data is None:
+            raise KeyError(tournament_id)
+        with ExitStack() as writing:
+            with self.lock(tournament_id):
+                current = data.get("rounds") or []
+                if not 0 <= first_round <= len(current):
+                    raise IndexError(first_round)
+                if any(_has_results(round_data) for round_data in current[first_round:]):
+                    raise ValueError("Las rondas a regenerar ya tienen resultados")
+                data["players"] = list(players)
+                data["rounds"] = current[:first_round] + list(rounds)
+                data["rounds_count"] = len(data["rounds"])
+                data["version"] = data.get("version", 0) + 1
+                with self._lock:
+                    self._standings.pop(tournament_id, None)
+                    self._dirty.pop(tournament_id, None)
+                for listener in self._listeners:
+                    listener(tournament_id, data, None)
+                snapshot = copy.deepcopy(data)
+                writing.enter_context(self._write_lock(tournament_id))
+            self.storage.save(tournament_id, snapshot)
+        return data
+
+    def delete(self, tournament_id):
+        with self.lock(tournament_id), self._write_lock(tournament_id):
+            with self._lock:
+                self._cache.pop(tournament_id, None)
+                self._dirty.pop(tournament_id, None)
+                self._standings.pop(tournament_id, None)
+            self.storage.delete(tournament_id)
+            # Los cerrojos se descartan en cuanto nadie los use.
+            self.locks.forget(tournament_id)
+            self.locks.forget(f"flush:{tournament_id}")
+
+    def flush(self, tournament_id=None):
+        with self._lock:
+            if tournament_id is None:
+                ids = list(self._dirty)
+            else:
+                ids = [tournament_id] if tournament_id in self._dirty else []
+        flushed = []
+        for dirty_id in ids:
+            with ExitStack() as writing:
+                with self.lock(dirty_id):
+                    with self._lock:
+                        entry = self._dirty.pop(dirty_id, None)
+                        data = self._cache.get(dirty_id)
+                    if entry is None or data is None:
+                        continue
+                    # Copia bajo el cerrojo del torneo; el disco se escribe
+                    # fuera de el pero en el orden de las copias.
+                    matches = sorted(entry["matches"])
+                    snapshot = self.storage.capture(data, matches)
+                    writing.enter_context(self._write_lock(dirty_id))
+                try:
+                    self.storage.record_results(dirty_id, snapshot, matches)
+                except OSError as exc:
+                    print(f"No se pudo guardar el torneo {dirty_id}: {exc}")
+                    with self._lock:
+                        entry = self._dirty.setdefault(
+                            dirty_id, {"since": time.monotonic(), "matches": set()}
+                        )
+                        entry["matches"].update(matches)
+                    continue
+                for listener in self._flush_listeners:
+                    listener(dirty_id)
+            flushed.append(dirty_id)
+        return flushed
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._dirty and not self._closed:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+                oldest = min(entry["since"] for entry in self._dirty.values())
+                remaining = oldest + self.flush_delay - time.monotonic()
+                if remaining > 0:
+                    self._wakeup.wait(remaining)
+                    continue
+            self.flush()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify_all()
+        self.flush()
+
+
+def _has_results(round_data):
+    for match in round_data.get("matches") or []:
+        result = match.get("result") or {}
+        if result.get("teamA") is not None or result.get("teamB") is not None:
+            return True
+    return False
+
+
+def create_repository(storage, flush_delay=None):
+    """Repositorio sobre ``storage``; ``flush_delay`` sale de ``GTR_FLUSH_DELAY``.
+
+    Con diario el valor por defecto es 0: anadir una linea cuesta poco y asi
+    cada resultado confirmado ya esta en disco. Con snapshot se espera
+    ``FLUSH_DELAY`` para no reescribir el fichero entero en cada resultado.
+    """
+    default = 0.0 if storage.mode == "journal" else FLUSH_DELAY
+    if flush_delay is None:
+        try:
+            flush_delay = float(os.environ.get("GTR_FLUSH_DELAY", default))
+        except ValueError:
+            flush_delay = default
+    return TournamentRepository(storage, flush_delay=flush_delay)
@@ -0,0 +1,193 @@
+import concurrent.futures
+import random
+import threading
+import time
+import uuid
+
+from scheduler import (
+    ScheduleError,
+    ScheduleOptimizer,
+    anneal_stage,
+    build_rounds_payload,
+    schedule_metrics,
+    submit,
+    usable_courts,
+    validate_request,
+)
+
+# Tres tramos (1 + 2 + 4 s): de sobra para un torneo normal; el organizador
+# puede aceptar antes y quien quiera mas lo pide con ``time_budget``.
+JOB_TIME_BUDGET = 7.0
+MAX_JOB_TIME = 30.0
+# Cada tramo enfria desde cero partiendo del mejor calendario; duplicarlos
+# deja algo decente pronto y sigue mejorando si se le deja. Con el tope el
+# progreso llega al menos cada MAX_STAGE segundos.
+FIRST_STAGE = 1.0
+MAX_STAGE = 4.0
+PROGRESS_EVERY = 0.5
+MAX_RUNNING_JOBS = 2
+JOB_TTL = 600.0
+CHANNEL_PREFIX = "schedule:"
+
+
+class ScheduleJobs:
+    """Sorteos en segundo plano que se pueden parar en cualquier momento.
+
+    Cada trabajo publica en ``broker`` (canal ``schedule:<id>``) el mejor
+    calendario encontrado hasta ahora; al pararlo se queda con ese. Los
+    tramos de recocido corren en el pool de procesos de ``scheduler`` para
+    no quitar el GIL a las peticiones; aqui solo se espera y se publica.
+    """
+
+    def __init__(self, broker, max_running=MAX_RUNNING_JOBS, ttl=JOB_TTL):
+        self.broker = broker
+        self.max_running = max_running
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    @staticmethod
+    def channel(job_id):
+        return CHANNEL_PREFIX + job_id
+
+    def start(self, players, courts, rounds, time_budget=JOB_TIME_BUDGET, seed=None):
+        players = sorted(players)
+        validate_request(players, courts, rounds)
+        if seed is None:
+            seed = random.randrange(2**31)
+        time_budget = max(FIRST_STAGE, min(float(time_budget), MAX_JOB_TIME))
+        optimizer = ScheduleOptimizer(len(players), courts, rounds, random.Random(seed))
+        job = {
+            "id": uuid.uuid4().hex,
+            "players": players,
+            "optimizer": optimizer,
+            "stop": threading.Event(),
+            "started": time.monotonic(),
+            "finished": None,
+            "state": None,
+            "iterations": 0,
+        }
+        job["thread"] = threading.Thread(
+            target=self._run,
+            args=(job, time_budget),
+            name=f"schedule-job-{job['id'][:8]}",
+            daemon=True,
+        )
+        job["base"] = {
+            "id": job["id"],
+            "courts": usable_courts(len(players), courts),
+            "seed": seed,
+        }
+        with self._lock:
+            self._prune_locked()
+            running = sum(1 for item in self._jobs.values() if item["finished"] is None)
+            if running >= self.max_running:
+                raise ScheduleError("Hay demasiados sorteos en marcha.")
+            self._jobs[job["id"]] = job
+        self._publish(job, "progress", optimizer.cost, optimizer.rounds)
+        job["thread"].start()
+        return job["state"]
+
+    def _publish(self, job, status, cost, rounds):
+        optimizer = job["optimizer"]
+        schedule = optimizer.schedule(rounds)
+        state = dict(
+            job["base"],
+            status=status,
+            cost=cost,
+            iterations=job["iterations"],
+            elapsed=round(time.monotonic() - job["started"], 2),
+            metrics=schedule_metrics(len(job["players"]), schedule),
+            rounds=build_rounds_payload(job["players"], schedule),
+        )
+        event = dict(state, type=status)
+        with self._lock:
+            state["version"] = self.broker.publish(self.channel(job["id"]), [event])
+            job["state"] = state
+
+    def _run(self, job, time_budget):
+        optimizer = job["optimizer"]
+        stop = job["stop"]
+        deadline = time.monotonic() + time_budget
+        stage = FIRST_STAGE
+        seeds = random.Random(job["base"]["seed"])
+        cost, rounds = optimizer.cost, optimizer.rounds
+        try:
+            while not stop.is_set() and cost > optimizer.lower_bound():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                args = (
+                    optimizer.n,
+                    optimizer.courts,
+                    optimizer.rounds_count,
+                    seeds.randrange(2**31),
+                    rounds,
+                    min(stage, remaining),
+                )
+                result = self._run_stage(args, stop)
+                if result is None:
+                    break
+                stage_cost, stage_rounds, iterations = result
+                job["iterations"] += iterations
+                if stage_cost < cost:
+                    cost, rounds = stage_cost, stage_rounds
+                    self._publish(job, "progress", cost, rounds)
+                stage = min(stage * 2, MAX_STAGE)
+        finally:
+            job["finished"] = time.monotonic()
+            status = "stopped" if stop.is_set() else "done"
+            self._publish(job, status, cost, rounds)
+
+    @staticmethod
+    def _run_stage(args, stop):
+        """Un tramo en el pool; ``None`` si se para antes de que acabe."""
+        future = submit(anneal_stage, *args)
+        while future is not None:
+            try:
+                return future.result(timeout=PROGRESS_EVERY)
+            except concurrent.futures.TimeoutError:
+                if stop.is_set():
+                    # El proceso acaba el tramo por su cuenta (como mucho
+                    # MAX_STAGE segundos); el trabajo no le espera.
+                    future.cancel()
+                    return None
+            except concurrent.futures.process.BrokenProcessPool:
+                future = None
+        # Sin pool se hace en este hilo.
+        return anneal_stage(*args, should_stop=stop.is_set)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job["state"] if job else None
+
+    def wait(self, job_id, since, timeout):
+        """Espera a que el trabajo pase de la version ``since`` (long-poll)."""
+        if self.get(job_id) is None:
+            return None
+        self.broker.wait(self.channel(job_id), since, timeout)
+        return self.get(job_id)
+
+    def stop(self, job_id, timeout=5.0):
+        """Para el trabajo y devuelve el mejor calendario que tenga."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job["stop"].set()
+        job["thread"].join(timeout)
+        return self.get(job_id)
+
+    def _prune_locked(self):
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job["finished"] is not None and now - job["finished"] > self.ttl:
+                del self._jobs[job_id]
+                self.broker.discard(self.channel(job_id))
+
+    def close(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job["stop"].set()
@@ -0,0 +1,786 @@
+import concurrent.futures
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+import match_scheduler
+from storage import write_file_atomic
+
+ENGINE_VERSION = 2
+ENGINES = ("anneal", "greedy")
+TIME_BUDGET = 1.0
+# Regenerar las rondas pendientes tiene que ser casi inmediato.
+RESCHEDULE_BUDGET = 0.5
+MAX_TIME_BUDGET = 10.0
+# Iteraciones por segundo de presupuesto en las ejecuciones con semilla: asi
+# el resultado no depende de la velocidad de la maquina.
+ITERATIONS_PER_SECOND = 60000
+# Margen de reloj sobre el presupuesto: en una maquina lenta las iteraciones
+# tardan mas, pero nunca se espera mas del doble de lo pedido.
+WALL_CLOCK_FACTOR = 2.0
+# Arranques independientes repartidos entre procesos; se queda el mejor.
+MAX_WORKERS = 8
+MAX_RESTARTS = 32
+# Por defecto uno: el numero de arranques cambia el calendario, asi que no
+# puede depender de los nucleos de la maquina. Se piden mas con ``restarts``.
+DEFAULT_RESTARTS = 1
+CACHE_LIMIT = 500
+
+# Pesos del coste: cada repeticion cuesta mas que la anterior.
+PARTNER_WEIGHT = 100
+OPPONENT_WEIGHT = 10
+REST_WEIGHT = 200
+REST_STREAK_WEIGHT = 20
+
+
+class ScheduleError(ValueError):
+    pass
+
+
+def usable_courts(players_count, courts):
+    return min(courts, players_count // 4)
+
+
+def validate_request(players, courts, rounds):
+    if len(players) < 4:
+        raise ScheduleError("Se necesitan al menos 4 jugadores para generar partidos.")
+    if len(set(players)) != len(players):
+        raise ScheduleError("Hay jugadores repetidos.")
+    if courts < 1 or rounds < 1:
+        raise ScheduleError("El numero de pistas y rondas debe ser al menos 1.")
+
+
+def _pair_cost(count, weight):
+    return weight * count * (count - 1) // 2
+
+
+class ScheduleOptimizer:
+    """Recocido simulado sobre el calendario completo.
+
+    Cada ronda es una permutacion de los indices de jugador: las posiciones
+    ``4*k .. 4*k+3`` forman el partido ``k`` (pareja ``4k, 4k+1`` contra
+    ``4k+2, 4k+3``) y el resto descansa. Las veces que cada par de jugadores
+    ha sido pareja o rival se guardan en listas planas ``a * n + b``; un
+    movimiento intercambia dos jugadores de una ronda y solo se recalculan
+    los pares de los partidos tocados.
+    """
+
+    def __init__(self, players_count, courts, rounds, rng=None, history=None):
+        self.n = players_count
+        self.courts = usable_courts(players_count, courts)
+        self.rounds_count = rounds
+        self.playing = self.courts * 4
+        self.rng = rng or random.Random()
+        self.rounds = []
+        self.cost = 0
+        self.iterations = 0
+        self.interrupted = False
+        self._set_history(history or [])
+        self._reset_counts()
+        self._initial_rounds()
+
+    def _set_history(self, history):
+        """Rondas ya jugadas que no se tocan pero cuentan en el coste.
+
+        ``history`` es una lista de ``(partidos, descansan)`` con indices;
+        ``None`` marca a un jugador que ya no esta en el torneo.
+        """
+        size = self.n * self.n
+        partners = [0] * size
+        opponents = [0] * size
+        rests = [0] * self.n
+        last_resting = set()
+        for matches, resting in history:
+            for team_a, team_b in matches:
+                for a, b in (team_a, team_b):
+                    if a is not None and b is not None:
+                        partners[min(a, b) * self.n + max(a, b)] += 1
+                for a in team_a:
+                    for b in team_b:
+                        if a is not None and b is not None:
+                            opponents[min(a, b) * self.n + max(a, b)] += 1
+            last_resting = {player for player in resting if player is not None}
+            for player in last_resting:
+                rests[player] += 1
+        self._history = (partners, opponents, rests)
+        self._last_resting = last_resting if history else set()
+
+    def _reset_counts(self):
+        partners, opponents, rests = self._history
+        self.partners = list(partners)
+        self.opponents = list(opponents)
+        self.rests = list(rests)
+
+    # -- coste --------------------------------------------------------------
+
+    def _bump_pair(self, counts, weight, a, b, step):
+        index = a * self.n + b if a < b else b * self.n + a
+        count = counts[index]
+        if step > 0:
+            delta = weight * count
+        else:
+            delta = -weight * (count - 1)
+        counts[index] = count + step
+        return delta
+
+    def _match_delta(self, order, match, step):
+        base = match * 4
+        a, b, c, d = order[base : base + 4]
+        partners = self.partners
+        opponents = self.opponents
+        delta = self._bump_pair(partners, PARTNER_WEIGHT, a, b, step)
+        delta += self._bump_pair(partners, PARTNER_WEIGHT, c, d, step)
+        delta += self._bump_pair(opponents, OPPONENT_WEIGHT, a, c, step)
+        delta += self._bump_pair(opponents, OPPONENT_WEIGHT, a, d, step)
+        delta += self._bump_pair(opponents, OPPONENT_WEIGHT, b, c, step)
+        delta += self._bump_pair(opponents, OPPONENT_WEIGHT, b, d, step)
+        return delta
+
+    def _resting(self, round_index, player):
+        if round_index < 0:
+            return round_index == -1 and player in self._last_resting
+        if round_index >= len(self.rounds):
+            return False
+        return self._positions[round_index][player] >= self.playing
+
+    def _rest_delta(self, round_index, player, step):
+        rest = self.rests[player]
+        if step > 0:
+            delta = REST_WEIGHT * (2 * rest + 1)
+        else:
+            delta = REST_WEIGHT * (1 - 2 * rest)
+        self.rests[player] = rest + step
+        neighbours = int(self._resting(round_index - 1, player)) + int(
+            self._resting(round_index + 1, player)
+        )
+        return delta + step * REST_STREAK_WEIGHT * neighbours
+
+    def _full_cost(self):
+        cost = 0
+        for count in self.partners:
+            cost += _pair_cost(count, PARTNER_WEIGHT)
+        for count in self.opponents:
+            cost += _pair_cost(count, OPPONENT_WEIGHT)
+        for rest in self.rests:
+            cost += REST_WEIGHT * rest * rest
+        for round_index in range(len(self.rounds)):
+            for player in range(self.n):
+                if self._resting(round_index, player) and self._resting(
+                    round_index - 1, player
+                ):
+                    cost += REST_STREAK_WEIGHT
+        return cost
+
+    def lower_bound(self):
+        """Coste minimo alcanzable solo por el reparto de descansos."""
+        if any(self._history[2]) or any(self._history[0]):
+            # Con historial la cota exacta no compensa: se agota el presupuesto.
+            return 0
+        total = (self.n - self.playing) * self.rounds_count
+        base, extra = divmod(total, self.n)
+        return REST_WEIGHT * (
+            extra * (base + 1) * (base + 1) + (self.n - extra) * base * base
+        )
+
+    # -- solucion inicial ---------------------------------------------------
+
+    def _initial_rounds(self):
+        self._positions = []
+        for round_index in range(self.rounds_count):
+            # Descansan primero quienes menos han descansado.
+            order = list(range(self.n))
+            self.rng.shuffle(order)
+            order.sort(key=lambda player: -self.rests[player])
+            self.rounds.append(order)
+            positions = [0] * self.n
+            for position, player in enumerate(order):
+                positions[player] = position
+            self._positions.append(positions)
+            for match in range(self.courts):
+                self._match_delta(order, match, 1)
+            for player in order[self.playing :]:
+                self.rests[player] += 1
+        self.cost = self._full_cost()
+
+    # -- busqueda -----------------------------------------------------------
+
+    def _swap(self, round_index, first, second):
+        order = self.rounds[round_index]
+        positions = self._positions[round_index]
+        to_bench = second >= self.playing
+        matches = {first // 4} if to_bench else {first // 4, second // 4}
+        delta = 0
+        for match in matches:
+            delta += self._match_delta(order, match, -1)
+        player_a = order[first]
+        player_b = order[second]
+        if to_bench:
+            # Uno pasa a descansar y el otro a jugar.
+            delta += self._rest_delta(round_index, player_a, 1)
+            delta += self._rest_delta(round_index, player_b, -1)
+        order[first], order[second] = player_b, player_a
+        positions[player_a], positions[player_b] = second, first
+        for match in matches:
+            delta += self._match_delta(order, match, 1)
+        return delta
+
+    def _pick_move(self):
+        round_index = self.rng.randrange(self.rounds_count)
+        first = self.rng.randrange(self.playing)
+        second = self.rng.randrange(self.n - 1)
+        if second >= first:
+            second += 1
+        if second < first:
+            first, second = second, first
+        if second < self.playing and first // 4 == second // 4:
+            # Cambiar dentro de la misma pareja no cambia nada.
+            if (first % 4) // 2 == (second % 4) // 2:
+                return None
+        return round_index, first, second
+
+    def run(
+        self,
+        time_budget=TIME_BUDGET,
+        should_stop=None,
+        max_iterations=None,
+        on_progress=None,
+        progress_every=0.5,
+    ):
+        """Optimiza durante ``time_budget`` segundos y deja el mejor calendario.
+
+        Con ``max_iterations`` el recorrido (y la temperatura) dependen solo
+        de la semilla, no de la velocidad de la maquina, salvo que el reloj
+        lo impida: entonces ``interrupted`` queda a verdadero.
+        ``on_progress(coste, rondas)`` recibe el mejor calendario cada vez
+        que mejora, como mucho una vez cada ``progress_every`` segundos; las
+        rondas solo valen durante la llamada.
+        """
+        best_cost = self.cost
+        best_rounds = [list(order) for order in self.rounds]
+        target = self.lower_bound()
+        started = time.perf_counter()
+        deadline = started + time_budget
+        temperature_start = float(PARTNER_WEIGHT)
+        temperature_end = 0.5
+        temperature = temperature_start
+        rng_random = self.rng.random
+        check_every = 256
+        reported_cost = best_cost
+        reported_at = started
+        while best_cost > target:
+            self.iterations += 1
+            if self.iterations % check_every == 0:
+                now = time.perf_counter()
+                if (
+                    on_progress is not None
+                    and best_cost < reported_cost
+                    and now - reported_at >= progress_every
+                ):
+                    on_progress(best_cost, best_rounds)
+                    reported_cost = best_cost
+                    reported_at = now
+                if now >= deadline or (should_stop is not None and should_stop()):
+                    self.interrupted = True
+                    break
+                progress = (now - started) / time_budget if time_budget else 1.0
+                if max_iterations:
+                    if self.iterations >= max_iterations:
+                        break
+                    # Si el reloj va por delante de las iteraciones tambien
+                    # se enfria, aunque el resultado deja de ser repetible.
+                    if progress > self.iterations / max_iterations:
+                        self.interrupted = True
+                    else:
+                        progress = self.iterations / max_iterations
+                temperature = temperature_start * (
+                    (temperature_end / temperature_start) ** progress
+                )
+            move = self._pick_move()
+            if move is None:
+                continue
+            delta = self._swap(*move)
+            if delta <= 0 or rng_random() < math.exp(-delta / temperature):
+                self.cost += delta
+                if self.cost < best_cost:
+                    best_cost = self.cost
+                    best_rounds = [list(order) for order in self.rounds]
+            else:
+                self._swap(*move)
+        self._restore(best_rounds)
+        return best_cost
+
+    def _restore(self, rounds):
+        self._reset_counts()
+        self.rounds = rounds
+        self._positions = []
+        for order in rounds:
+            positions = [0] * self.n
+            for position, player in enumerate(order):
+                positions[player] = position
+            self._positions.append(positions)
+            for match in range(self.courts):
+                self._match_delta(order, match, 1)
+            for player in order[self.playing :]:
+                self.rests[player] += 1
+        self.cost = self._full_cost()
+
+    def schedule(self, rounds=None):
+        """Rondas como listas de indices: ``[(partidos, descansan), ...]``."""
+        result = []
+        for order in self.rounds if rounds is None else rounds:
+            matches = []
+            for match in range(self.courts):
+                a, b, c, d = order[match * 4 : match * 4 + 4]
+                matches.append(((a, b), (c, d)))
+            result.append((matches, sorted(order[self.playing :])))
+        return result
+
+
+def schedule_metrics(players_count, schedule):
+    """Calidad de un calendario: parejas sin estrenar, rivales repetidos..."""
+    partners = {}
+    opponents = {}
+    rests = [0] * players_count
+    for matches, resting in schedule:
+        for team_a, team_b in matches:
+            for team in (team_a, team_b):
+                key = tuple(sorted(team))
+                partners[key] = partners.get(key, 0) + 1
+            for a in team_a:
+                for b in team_b:
+                    key = (a, b) if a < b else (b, a)
+                    opponents[key] = opponents.get(key, 0) + 1
+        for player in resting:
+            rests[player] += 1
+    pairs = players_count * (players_count - 1) // 2
+    return {
+        "unmet_partner_pairs": pairs - len(partners),
+        "repeated_partners": sum(count - 1 for count in partners.values()),
+        "repeated_opponents": sum(count - 1 for count in opponents.values()),
+        "rest_spread": max(rests) - min(rests) if rests else 0,
+    }
+
+
+def build_rounds_payload(players, schedule, first_index=0):
+    """Mismo formato de rondas que guarda ``index.html`` al crear el torneo."""
+    rounds = []
+    for round_index, (matches, resting) in enumerate(schedule, start=first_index):
+        rounds.append(
+            {
+                "index": round_index,
+                "matches": [
+                    {
+                        "index": match_index,
+                        "teams": [
+                            [players[team_a[0]], players[team_a[1]]],
+                            [players[team_b[0]], players[team_b[1]]],
+                        ],
+                        "result": {"teamA": None, "teamB": None},
+                    }
+                    for match_index, (team_a, team_b) in enumerate(matches)
+                ],
+                "bench": [players[player] for player in resting],
+            }
+        )
+    return rounds
+
+
+class ScheduleCache:
+    """Calendarios ya generados, un JSON por combinacion de parametros.
+
+    La clave es un hash de (jugadores ordenados, pistas, rondas, semilla,
+    motor y su version), asi que repetir un sorteo no vuelve a buscar.
+    """
+
+    def __init__(self, directory, limit=CACHE_LIMIT):
+        self.directory = directory
+        self.limit = limit
+
+    @staticmethod
+    def key(players, courts, rounds, seed, engine, max_iterations, restarts=1):
+        payload = json.dumps(
+            [
+                sorted(players),
+                courts,
+                rounds,
+                seed,
+                engine,
+                ENGINE_VERSION,
+                max_iterations,
+                restarts,
+            ],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self.path(key), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, data):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            write_file_atomic(self.path(key), payload, generations=0, fsync=False)
+            self._prune()
+        except OSError as exc:
+            print(f"No se pudo guardar el calendario en cache: {exc}")
+
+    def _prune(self):
+        entries = [
+            entry
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and entry.name.endswith(".json")
+        ]
+        if len(entries) <= self.limit:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[: len(entries) - self.limit]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def default_workers():
+    try:
+        workers = int(os.environ.get("GTR_SCHEDULE_WORKERS", 0))
+    except ValueError:
+        workers = 0
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, MAX_WORKERS))
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn y no fork: el servidor tiene hilos y un hijo hecho con
+            # fork podria heredar un cerrojo tomado por otro de ellos.
+            _executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=default_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def warm_executor():
+    """Arranca los procesos del recocido sin esperarlos (al abrir el servidor).
+
+    Asi el primer calendario no gasta su reloj en crearlos.
+    """
+    if default_workers() <= 1:
+        return
+    executor = _get_executor()
+    try:
+        for _ in range(default_workers()):
+            executor.submit(_warm_up)
+    except concurrent.futures.process.BrokenProcessPool:
+        _discard_executor(executor)
+
+
+def _discard_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def submit(function, *args):
+    """Lanza ``function(*args)`` en el pool de procesos; ``None`` si esta roto."""
+    executor = _get_executor()
+    try:
+        return executor.submit(function, *args)
+    except concurrent.futures.process.BrokenProcessPool:
+        _discard_executor(executor)
+        return None
+
+
+def anneal_stage(
+    players_count, courts, rounds, seed, start_rounds, time_budget, should_stop=None
+):
+    """Un tramo de recocido desde ``start_rounds``; cabe en un proceso del pool.
+
+    Devuelve ``(coste, rondas, iteraciones)`` con el mejor calendario del tramo.
+    """
+    optimizer = ScheduleOptimizer(players_count, courts, rounds, random.Random(seed))
+    optimizer._restore([list(order) for order in start_rounds])
+    cost = optimizer.run(time_budget, should_stop=should_stop)
+    return cost, optimizer.rounds, optimizer.iterations
+
+
+def restart_seeds(seed, restarts):
+    """El primer arranque usa la semilla tal cual; con uno solo no cambia nada."""
+    rng = random.Random(seed)
+    return [seed] + [rng.randrange(2**31) for _ in range(restarts - 1)]
+
+
+def _anneal_once(players_count, courts, rounds, seed, max_iterations, deadline, history):
+    optimizer = ScheduleOptimizer(
+        players_count, courts, rounds, random.Random(seed), history=history
+    )
+    # ``deadline`` es de ``time.time()``: vale igual en cualquier proceso.
+    cost = optimizer.run(
+        max(0.0, deadline - time.time()), max_iterations=max_iterations
+    )
+    return cost, optimizer.schedule(), optimizer.iterations, not optimizer.interrupted
+
+
+def anneal(
+    players_count,
+    courts,
+    rounds,
+    seed,
+    max_iterations,
+    time_budget,
+    restarts=1,
+    history=None,
+):
+    """Recocido con ``restarts`` arranques en paralelo; gana el de menor coste.
+
+    ``time_budget`` es el limite de reloj para todo: al agotarse se cancelan
+    los arranques que no han empezado y los que estan en marcha se paran
+    solos. El de ``seed`` se hace siempre en este hilo mientras los procesos
+    hacen el resto, asi un pool lento o roto no lo deja sin reloj. Devuelve
+    ``(coste, calendario, iteraciones, completo)``; completo es falso si el
+    reloj corto alguna busqueda.
+    """
+    deadline = time.time() + time_budget
+    seeds = restart_seeds(seed, restarts)
+    args = (players_count, courts, rounds)
+    if restarts <= 1 or default_workers() <= 1:
+        results = [
+            _anneal_once(*args, restart_seed, max_iterations, deadline, history)
+            for restart_seed in seeds
+            if time.time() < deadline or restart_seed == seed
+        ]
+        complete = len(results) == len(seeds) and all(item[3] for item in results)
+    else:
+        executor = _get_executor()
+        try:
+            futures = [
+                executor.submit(
+                    _anneal_once, *args, restart_seed, max_iterations, deadline, history
+                )
+                for restart_seed in seeds[1:]
+            ]
+        except concurrent.futures.process.BrokenProcessPool:
+            _discard_executor(executor)
+            futures = []
+        results = [_anneal_once(*args, seed, max_iterations, deadline, history)]
+        # Un poco de margen para recoger a los que se estan parando.
+        done, pending = concurrent.futures.wait(
+            futures, timeout=max(0.0, deadline - time.time()) + 0.25
+        )
+        for future in pending:
+            future.cancel()
+        broken = False
+        for future in futures:
+            if future not in done:
+                continue
+            try:
+                results.append(future.result())
+            except concurrent.futures.process.BrokenProcessPool:
+                broken = True
+        if broken:
+            _discard_executor(executor)
+        complete = len(results) == len(seeds) and all(item[3] for item in results)
+    # A igual coste gana el primero, asi el resultado no depende del orden
+    # en que terminen los procesos.
+    cost, schedule, _iterations, _complete = min(results, key=lambda item: item[0])
+    iterations = sum(item[2] for item in results)
+    return cost, schedule, iterations, complete
+
+
+def _greedy_schedule(players, courts, rounds, seed):
+    data = match_scheduler.generate_schedule(
+        players, courts, rounds, shuffle=True, matcher="pruned", seed=seed
+    )
+    if data["error"]:
+        raise ScheduleError(data["error"])
+    # El voraz devuelve indices sobre su propio orden de jugadores.
+    position = {name: index for index, name in enumerate(players)}
+    names = data["names"]
+
+    def remap(team):
+        return tuple(position[names[player]] for player in team)
+
+    return [
+        (
+            [(remap(team1), remap(team2)) for team1, team2 in round_data["matches"]],
+            sorted(position[names[player]] for player in round_data["resting"]),
+        )
+        for round_data in data["rounds"]
+    ]
+
+
+def generate_schedule(
+    players,
+    courts,
+    rounds,
+    time_budget=TIME_BUDGET,
+    seed=None,
+    engine="anneal",
+    max_iterations=None,
+    cache=None,
+    restarts=None,
+):
+    """Genera el calendario; con la misma semilla sale siempre el mismo.
+
+    Sin ``seed`` se elige una al azar y se devuelve en el resultado para
+    poder repetir el sorteo. Los jugadores se ordenan antes de buscar, asi
+    el orden en que se escribieron no cambia el resultado. ``restarts`` es
+    cuantas busquedas independientes se lanzan (``DEFAULT_RESTARTS`` si no
+    se dice); tambien se devuelve, porque con otro numero sale otro
+    calendario.
+    """
+    players = sorted(players)
+    validate_request(players, courts, rounds)
+    if engine not in ENGINES:
+        raise ScheduleError(f"Motor de calendario desconocido: {engine}")
+    if seed is None:
+        seed = random.randrange(2**31)
+    time_budget = max(0.0, min(float(time_budget), MAX_TIME_BUDGET))
+    if engine == "anneal" and max_iterations is None:
+        max_iterations = max(1, int(time_budget * ITERATIONS_PER_SECOND))
+        time_budget = min(time_budget * WALL_CLOCK_FACTOR, MAX_TIME_BUDGET)
+    if restarts is None:
+        restarts = DEFAULT_RESTARTS if engine == "anneal" else 1
+    restarts = max(1, min(int(restarts), MAX_RESTARTS))
+    complete = True
+    key = None
+    if cache is not None:
+        key = cache.key(
+            players, courts, rounds, seed, engine, max_iterations, restarts
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return dict(cached, cached=True)
+
+    if engine == "greedy":
+        schedule = _greedy_schedule(players, courts, rounds, seed)
+        cost = None
+        iterations = 0
+    else:
+        cost, schedule, iterations, complete = anneal(
+            len(players),
+            courts,
+            rounds,
+            seed,
+            max_iterations,
+            time_budget,
+            restarts=restarts,
+        )
+    data = {
+        "courts": usable_courts(len(players), courts),
+        "rounds": build_rounds_payload(players, schedule),
+        "cost": cost,
+        "iterations": iterations,
+        "metrics": schedule_metrics(len(players), schedule),
+        "seed": seed,
+        "restarts": restarts,
+        "engine": engine,
+        "engine_version": ENGINE_VERSION,
+    }
+    # Si el reloj corto algun arranque el resultado no es repetible.
+    if cache is not None and complete:
+        cache.put(key, data)
+    return dict(data, cached=False)
+
+
+def history_from_rounds(players, rounds):
+    """Pasa rondas guardadas al formato de indices de ``ScheduleOptimizer``.
+
+    Quien ya no este en ``players`` queda como ``None``: sus partidos no
+    cuentan para nadie, pero el resto de la ronda si.
+    """
+    position = {name: index for index, name in enumerate(players)}
+    history = []
+    for round_data in rounds:
+        matches = []
+        present = set()
+        for match in round_data.get("matches") or []:
+            teams = match.get("teams") or []
+            if len(teams) != 2 or any(len(team) != 2 for team in teams):
+                continue
+            team_a, team_b = (
+                tuple(position.get(name) for name in team) for team in teams
+            )
+            matches.append((team_a, team_b))
+            present.update(team_a + team_b)
+        # Los que no jugaron esa ronda, incluidos los recien llegados,
+        # cuentan como descanso.
+        resting = [index for index in range(len(players)) if index not in present]
+        history.append((matches, resting))
+    return history
+
+
+def reschedule(
+    players,
+    courts,
+    played_rounds,
+    rounds,
+    time_budget=RESCHEDULE_BUDGET,
+    seed=None,
+    restarts=None,
+):
+    """Rehace solo las rondas que faltan tras un cambio de jugadores.
+
+    ``played_rounds`` son las rondas ya disputadas tal y como estan
+    guardadas; no se tocan, pero sus parejas, rivales y descansos pesan en
+    el coste para no repetirlos. ``rounds`` es cuantas rondas nuevas hacen
+    falta. Los jugadores se ordenan solo para buscar; ``players`` vuelve en
+    el orden recibido.
+    """
+    ordered = sorted(players)
+    validate_request(ordered, courts, rounds)
+    if seed is None:
+        seed = random.randrange(2**31)
+    time_budget = max(0.0, min(float(time_budget), MAX_TIME_BUDGET))
+    if restarts is None:
+        restarts = DEFAULT_RESTARTS
+    restarts = max(1, min(int(restarts), MAX_RESTARTS))
+    cost, schedule, iterations, _complete = anneal(
+        len(ordered),
+        courts,
+        rounds,
+        seed,
+        max(1, int(time_budget * ITERATIONS_PER_SECOND)),
+        min(time_budget * WALL_CLOCK_FACTOR, MAX_TIME_BUDGET),
+        restarts=restarts,
+        history=history_from_rounds(ordered, played_rounds),
+    )
+    return {
+        "players": list(players),
+        "courts": usable_courts(len(ordered), courts),
+        "rounds": build_rounds_payload(
+            ordered, schedule, first_index=len(played_rounds)
+        ),
+        "cost": cost,
+        "iterations": iterations,
+        "metrics": schedule_metrics(len(ordered), schedule),
+        "seed": seed,
+        "restarts": restarts,
+    }
@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+try:
+    from waitress.server import create_server as create_waitress_server
+except ImportError:  # Sin waitress solo queda el servidor de desarrollo.
+    create_waitress_server = None
+
+SERVER_MODES = ("auto", "waitress", "dev")
+# Cada conexion SSE o long-poll ocupa un hilo mientras esta abierta, asi que
+# hacen falta bastantes mas hilos que telefonos.
+THREADS = 128
+CONNECTION_LIMIT = 512
+BACKLOG = 1024
+# Segundos que se mantiene abierta una conexion ociosa esperando otra peticion.
+KEEPALIVE_TIMEOUT = 30
+DRAIN_SECONDS = 10.0
+
+
+def _env_number(name, default, cast=int):
+    try:
+        return cast(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def server_settings(mode=None, threads=None, keepalive=None, drain=None):
+    """Configuracion del servidor; lo que no se pasa sale de ``GTR_SERVER*``."""
+    mode = (mode or os.environ.get("GTR_SERVER") or "auto").lower()
+    if mode not in SERVER_MODES:
+        raise ValueError(f"Modo de servidor desconocido: {mode}")
+    if mode == "auto":
+        if create_waitress_server is None:
+            print("waitress no esta instalado: se usa el servidor de desarrollo.")
+        mode = "waitress" if create_waitress_server else "dev"
+    if mode == "waitress" and create_waitress_server is None:
+        raise RuntimeError("El modo waitress necesita el paquete waitress.")
+    return {
+        "mode": mode,
+        "threads": max(1, threads or _env_number("GTR_SERVER_THREADS", THREADS)),
+        "connection_limit": max(
+            1, _env_number("GTR_SERVER_CONNECTIONS", CONNECTION_LIMIT)
+        ),
+        "keepalive": max(
+            1, keepalive or _env_number("GTR_SERVER_KEEPALIVE", KEEPALIVE_TIMEOUT)
+        ),
+        "drain": max(
+            0.0,
+            drain if drain is not None
+            else _env_number("GTR_SERVER_DRAIN", DRAIN_SECONDS, float),
+        ),
+    }
+
+
+def _waitress_idle(server):
+    dispatcher = server.task_dispatcher
+    with dispatcher.lock:
+        if dispatcher.queue or dispatcher.active_count:
+            return False
+    return not any(
+        channel.requests or channel.total_outbufs_len
+        for channel in list(server.active_channels.values())
+    )
+
+
+class WebServer:
+    """Sirve ``app`` con waitress (o el de desarrollo) y lo vacia al salir.
+
+    ``on_shutdown`` registra funciones que se llaman tras dejar de aceptar
+    conexiones y antes de esperar a las abiertas (p. ej. cerrar los SSE).
+    """
+
+    def __init__(self, app, host, port, **settings):
+        self.settings = server_settings(**settings)
+        self.host = host
+        self._hooks = []
+        self._serving = threading.Event()
+        self._stopped = threading.Event()
+        if self.settings["mode"] == "waitress":
+            self._server = create_waitress_server(
+                app,
+                host=host,
+                port=port,
+                threads=self.settings["threads"],
+                connection_limit=self.settings["connection_limit"],
+                channel_timeout=self.settings["keepalive"],
+                backlog=BACKLOG,
+                ident="GestorTorneos",
+            )
+            self.port = self._server.effective_port
+        else:
+            self._server = make_server(host, port, app, threaded=True)
+            self.port = self._server.server_port
+
+    def on_shutdown(self, hook):
+        self._hooks.append(hook)
+
+    def serve_forever(self):
+        print(
+            f"Servidor web ({self.settings['mode']}, "
+            f"{self.settings['threads']} hilos) en {self.host}:{self.port}"
+        )
+        self._serving.set()
+        if self.settings["mode"] == "waitress":
+            self._server.run()
+        else:
+            self._server.serve_forever()
+
+    def shutdown(self, timeout=None):
+        """Deja de aceptar, avisa a los ``on_shutdown`` y espera a lo abierto."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        if timeout is None:
+            timeout = self.settings["drain"]
+        server = self._server
+        if self.settings["mode"] != "waitress":
+            if self._serving.is_set():
+                server.shutdown()
+            for hook in self._hooks:
+                hook()
+            server.server_close()
+            return
+        server.accepting = False
+        server.pull_trigger()
+        for hook in self._hooks:
+            hook()
+        # El bucle sigue enviando respuestas mientras los hilos vacian la cola.
+        deadline = time.monotonic() + timeout
+        while not _waitress_idle(server) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        server.task_dispatcher.shutdown(timeout=max(0.0, deadline - time.monotonic()))
+        closed = threading.Event()
+
+        def close_sockets():
+            try:
+                server.close()
+                server.asyncore.close_all(server._map)
+            finally:
+                closed.set()
+
+        if self._serving.is_set():
+            # Los sockets se cierran desde el hilo del bucle, que es quien
+            # los vigila; cerrarlos desde aqui le deja un select() roto.
+            server.trigger.pull_trigger(close_sockets)
+            closed.wait(1.0)
+        else:
+            close_sockets()
@@ -0,0 +1,242 @@
+import bisect
+
+
+def compute_player_stats(tournament):
+    stats = {}
+    for player in tournament.get("players", []):
+        stats[player] = {
+            "wins": 0,
+            "losses": 0,
+            "played": 0,
+            "points_for": 0,
+            "points_against": 0,
+        }
+    for round_info in tournament.get("rounds", []):
+        for match in round_info.get("matches", []):
+            result = match.get("result") or {}
+            score_a = result.get("teamA")
+            score_b = result.get("teamB")
+            if not isinstance(score_a, int) or not isinstance(score_b, int):
+                continue
+            team_a = match.get("teams", [[], []])[0]
+            team_b = match.get("teams", [[], []])[1]
+            team_a_wins = score_a > score_b
+            team_b_wins = score_b > score_a
+
+            for player in team_a:
+                stats.setdefault(
+                    player,
+                    {
+                        "wins": 0,
+                        "losses": 0,
+                        "played": 0,
+                        "points_for": 0,
+                        "points_against": 0,
+                    },
+                )
+                entry = stats[player]
+                entry["played"] += 1
+                entry["points_for"] += score_a
+                entry["points_against"] += score_b
+                if team_a_wins:
+                    entry["wins"] += 1
+                elif team_b_wins:
+                    entry["losses"] += 1
+
+            for player in team_b:
+                stats.setdefault(
+                    player,
+                    {
+                        "wins": 0,
+                        "losses": 0,
+                        "played": 0,
+                        "points_for": 0,
+                        "points_against": 0,
+                    },
+                )
+                entry = stats[player]
+                entry["played"] += 1
+                entry["points_for"] += score_b
+                entry["points_against"] += score_a
+                if team_b_wins:
+                    entry["wins"] += 1
+                elif team_a_wins:
+                    entry["losses"] += 1
+    return stats
+
+
+def build_scoreboard_rows(stats):
+    def _scoreboard_sort_key(item):
+        player, stat = item
+        return (
+            -stat["wins"],
+            stat["losses"],
+            -(stat["points_for"] - stat["points_against"]),
+            -stat["points_for"],
+            player.lower(),
+        )
+
+    sorted_stats = sorted(stats.items(), key=_scoreboard_sort_key)
+    rows = []
+    for row_index, (player, stat) in enumerate(sorted_stats, start=1):
+        rows.append(
+            [
+                row_index,
+                player,
+                stat["wins"],
+                stat["losses"],
+                stat["played"],
+                stat["points_for"],
+                stat["points_against"],
+            ]
+        )
+    return rows
+
+
+def is_match_complete(match):
+    result = match.get("result") or {}
+    return isinstance(result.get("teamA"), int) and isinstance(result.get("teamB"), int)
+
+
+def is_round_complete(round_info):
+    matches = round_info.get("matches", []) or []
+    return bool(matches) and all(is_match_complete(match) for match in matches)
+
+
+def get_active_round_index(rounds):
+    if not rounds:
+        return None
+    for index, round_info in enumerate(rounds):
+        if not is_round_complete(round_info):
+            return index
+    return len(rounds) - 1
+
+
+def _new_entry():
+    return {
+        "wins": 0,
+        "losses": 0,
+        "played": 0,
+        "points_for": 0,
+        "points_against": 0,
+    }
+
+
+def _match_contribution(match):
+    if not is_match_complete(match):
+        return None
+    teams = match.get("teams") or [[], []]
+    result = match["result"]
+    return (
+        tuple(teams[0]) if len(teams) > 0 else (),
+        tuple(teams[1]) if len(teams) > 1 else (),
+        result["teamA"],
+        result["teamB"],
+    )
+
+
+class StandingsEngine:
+    """Clasificacion que se actualiza partido a partido.
+
+    Guarda lo que cada partido aporta a cada jugador; al cambiar, borrar o
+    poner un resultado solo se resta lo anterior, se suma lo nuevo y se
+    recolocan en la lista ordenada los cuatro jugadores afectados. El orden
+    es el mismo que el de ``build_scoreboard_rows``.
+    """
+
+    def __init__(self, tournament):
+        self._stats = {}
+        self._seq = {}
+        self._contributions = {}
+        for player in tournament.get("players", []) or []:
+            self._ensure(player)
+        for round_index, round_info in enumerate(tournament.get("rounds", []) or []):
+            for match_index, match in enumerate(round_info.get("matches", []) or []):
+                contribution = _match_contribution(match)
+                if contribution is not None:
+                    self._contributions[(round_index, match_index)] = contribution
+                    self._apply(contribution, 1)
+        self._order = sorted((self._key(player), player) for player in self._stats)
+        self._rows = None
+
+    def _ensure(self, player):
+        if player not in self._stats:
+            self._stats[player] = _new_entry()
+            self._seq[player] = len(self._seq)
+        return self._stats[player]
+
+    def _key(self, player):
+        stat = self._stats[player]
+        return (
+            -stat["wins"],
+            stat["losses"],
+            -(stat["points_for"] - stat["points_against"]),
+            -stat["points_for"],
+            player.lower(),
+            self._seq[player],
+        )
+
+    def _apply(self, contribution, sign):
+        team_a, team_b, score_a, score_b = contribution
+        for team, scored, conceded in ((team_a, score_a, score_b), (team_b, score_b, score_a)):
+            for player in team:
+                entry = self._ensure(player)
+                entry["played"] += sign
+                entry["points_for"] += sign * scored
+                entry["points_against"] += sign * conceded
+                if scored > conceded:
+                    entry["wins"] += sign
+                elif conceded > scored:
+                    entry["losses"] += sign
+
+    def update_match(self, round_index, match_index, match):
+        """Aplica el estado actual de un partido; devuelve si cambio algo."""
+        key = (round_index, match_index)
+        old = self._contributions.get(key)
+        new = _match_contribution(match)
+        if old == new:
+            return False
+        affected = set()
+        for contribution in (old, new):
+            if contribution is not None:
+                affected.update(contribution[0])
+                affected.update(contribution[1])
+        old_keys = {
+            player: self._key(player) for player in affected if player in self._stats
+        }
+        if old is not None:
+            self._apply(old, -1)
+            del self._contributions[key]
+        if new is not None:
+            self._apply(new, 1)
+            self._contributions[key] = new
+        for player in affected:
+            old_key = old_keys.get(player)
+            if old_key is not None:
+                position = bisect.bisect_left(self._order, (old_key, player))
+                del self._order[position]
+            bisect.insort(self._order, (self._key(player), player))
+        self._rows = None
+        return True
+
+    def stats(self):
+        return self._stats
+
+    def rows(self):
+        if self._rows is None:
+            rows = []
+            for row_index, (_key, player) in enumerate(self._order, start=1):
+                stat = self._stats[player]
+                rows.append(
+                    [
+                        row_index,
+                        player,
+                        stat["wins"],
+                        stat["losses"],
+                        stat["played"],
+                        stat["points_for"],
+                        stat["points_against"],
+                    ]
+                )
+            self._rows = rows
+        return self._rows
@@ -0,0 +1,411 @@
+import copy
+import json
+import os
+import shutil
+import threading
+import time
+
+SNAPSHOT_SUFFIX = ".json"
+JOURNAL_SUFFIX = ".journal"
+TEMP_SUFFIX = ".tmp"
+COMPACT_EVERY = 200
+GENERATIONS = 3
+BATCH_WINDOW = 0.005
+
+
+def snapshot_path(directory, tournament_id):
+    return os.path.join(directory, f"{tournament_id}{SNAPSHOT_SUFFIX}")
+
+
+def journal_path(directory, tournament_id):
+    return os.path.join(directory, f"{tournament_id}{JOURNAL_SUFFIX}")
+
+
+def generation_path(path, generation):
+    return f"{path}.{generation}"
+
+
+def _fsync_directory(directory):
+    # En Windows no se puede abrir un directorio para sincronizarlo.
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _rotate_generations(path, generations):
+    if generations < 1 or not os.path.exists(path):
+        return
+    for generation in range(generations, 1, -1):
+        older = generation_path(path, generation - 1)
+        if os.path.exists(older):
+            os.replace(older, generation_path(path, generation))
+    newest = generation_path(path, 1)
+    try:
+        os.remove(newest)
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(path, newest)
+    except OSError:
+        shutil.copyfile(path, newest)
+
+
+def write_file_atomic(path, payload, generations=GENERATIONS, fsync=True):
+    temp_path = path + TEMP_SUFFIX
+    with open(temp_path, "wb") as file:
+        file.write(payload)
+        file.flush()
+        if fsync:
+            os.fsync(file.fileno())
+    _rotate_generations(path, generations)
+    os.replace(temp_path, path)
+
+
+def encode_snapshot(data):
+    return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def load_snapshot(path, generations=GENERATIONS):
+    """Carga ``path`` y, si esta corrupto, vuelve a la ultima generacion buena."""
+    candidates = [path] + [
+        generation_path(path, generation) for generation in range(1, generations + 1)
+    ]
+    last_error = None
+    for candidate in candidates:
+        try:
+            with open(candidate, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            continue
+        except (OSError, ValueError) as exc:
+            last_error = exc
+            continue
+        if candidate != path:
+            print(f"Fichero danado, restauro la copia {os.path.basename(candidate)}")
+            write_file_atomic(path, encode_snapshot(data), generations=0)
+        return data
+    if last_error is not None:
+        raise last_error
+    return None
+
+
+class SnapshotWriter:
+    """Hilo de escritura que agrupa las grabaciones (group commit).
+
+    Las peticiones que llegan mientras se escribe un lote esperan al
+    siguiente, y si varias apuntan al mismo fichero solo se escribe la
+    ultima version: una rafaga de grabaciones cuesta un fsync por fichero.
+    """
+
+    def __init__(self, generations=GENERATIONS, batch_window=BATCH_WINDOW, fsync=True):
+        self.generations = generations
+        self.batch_window = batch_window
+        self.fsync = fsync
+        self._condition = threading.Condition()
+        self._pending = {}
+        self._batch = 0
+        self._committed = 0
+        self._errors = {}
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="snapshot-writer", daemon=True
+            )
+            self._thread.start()
+
+    def write(self, path, payload, wait=True):
+        with self._condition:
+            self._ensure_thread()
+            self._pending[path] = payload
+            batch = self._batch + 1
+            self._condition.notify_all()
+            if not wait:
+                return
+            while self._committed < batch:
+                self._condition.wait()
+            error = self._errors.get(batch, {}).get(path)
+        if error is not None:
+            raise error
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+            if self.batch_window:
+                time.sleep(self.batch_window)
+            with self._condition:
+                self._batch += 1
+                batch = self._batch
+                pending, self._pending = self._pending, {}
+            errors = {}
+            directories = set()
+            for path, payload in pending.items():
+                try:
+                    write_file_atomic(
+                        path, payload, generations=self.generations, fsync=self.fsync
+                    )
+                    directories.add(os.path.dirname(path) or ".")
+                except OSError as exc:
+                    errors[path] = exc
+            if self.fsync:
+                for directory in directories:
+                    try:
+                        _fsync_directory(directory)
+                    except OSError:
+                        pass
+            with self._condition:
+                if errors:
+                    self._errors[batch] = errors
+                for old_batch in [key for key in self._errors if key < batch - 16]:
+                    del self._errors[old_batch]
+                self._committed = batch
+                self._condition.notify_all()
+
+
+def apply_result(data, round_index, match_index, result, version=None):
+    match = data["rounds"][round_index]["matches"][match_index]
+    match["result"] = {
+        "teamA": result.get("teamA"),
+        "teamB": result.get("teamB"),
+    }
+    if version is not None:
+        # Version del torneo en la que cambio este partido.
+        match["version"] = version
+    return match
+
+
+class SnapshotStorage:
+    """Cada torneo es un unico fichero JSON que se reescribe entero.
+
+    La escritura es atomica (fichero temporal, fsync y rename) y se guardan
+    ``generations`` copias anteriores para poder volver atras si el fichero
+    aparece corrupto al cargarlo.
+    """
+
+    mode = "snapshot"
+
+    def __init__(self, directory, generations=GENERATIONS, writer=None):
+        self.directory = directory
+        self.generations = generations
+        self.writer = writer or SnapshotWriter(generations=generations)
+
+    def path(self, tournament_id):
+        return snapshot_path(self.directory, tournament_id)
+
+    def exists(self, tournament_id):
+        return os.path.exists(self.path(tournament_id))
+
+    def load(self, tournament_id):
+        return load_snapshot(self.path(tournament_id), self.generations)
+
+    def save(self, tournament_id, data):
+        os.makedirs(self.directory, exist_ok=True)
+        self.writer.write(self.path(tournament_id), encode_snapshot(data))
+
+    def capture(self, data, matches):
+        """Copia de ``data`` con lo que ``record_results`` necesita de ella."""
+        return copy.deepcopy(data)
+
+    def record_results(self, tournament_id, data, matches):
+        self.save(tournament_id, data)
+
+    def delete(self, tournament_id):
+        path = self.path(tournament_id)
+        os.remove(path)
+        for generation in range(1, self.generations + 1):
+            try:
+                os.remove(generation_path(path, generation))
+            except FileNotFoundError:
+                pass
+
+    def recover(self):
+        return []
+
+
+class JournalStorage(SnapshotStorage):
+    """Snapshot JSON mas un diario de resultados en JSON lines.
+
+    Cada resultado se anade como una linea al fichero ``<id>.journal``; al
+    cargar se reaplica el diario sobre el snapshot. Cada ``compact_every``
+    lineas el diario se vuelca al snapshot y se vacia.
+    """
+
+    mode = "journal"
+
+    def __init__(
+        self,
+        directory,
+        compact_every=COMPACT_EVERY,
+        fsync=True,
+        generations=GENERATIONS,
+        writer=None,
+    ):
+        super().__init__(directory, generations=generations, writer=writer)
+        self.compact_every = max(1, int(compact_every))
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def journal_path(self, tournament_id):
+        return journal_path(self.directory, tournament_id)
+
+    def _read_journal(self, tournament_id):
+        path = self.journal_path(tournament_id)
+        if not os.path.exists(path):
+            return []
+        entries = []
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Ultima linea a medio escribir tras un corte: se descarta.
+                    break
+        return entries
+
+    def _replay(self, data, entries):
+        for entry in entries:
+            version = entry.get("version")
+            try:
+                apply_result(
+                    data,
+                    entry["round_index"],
+                    entry["match_index"],
+                    entry.get("result") or {},
+                    version if isinstance(version, int) else None,
+                )
+            except (IndexError, KeyError, TypeError):
+                continue
+            if isinstance(entry.get("version"), int):
+                data["version"] = max(data.get("version", 0), entry["version"])
+        return data
+
+    def load(self, tournament_id):
+        with self._lock:
+            return self._load_locked(tournament_id)
+
+    def _load_locked(self, tournament_id):
+        data = super().load(tournament_id)
+        if data is None:
+            return None
+        entries = self._read_journal(tournament_id)
+        self._pending[tournament_id] = len(entries)
+        return self._replay(data, entries)
+
+    def _save_locked(self, tournament_id, data):
+        super().save(tournament_id, data)
+        try:
+            os.remove(self.journal_path(tournament_id))
+        except FileNotFoundError:
+            pass
+        self._pending[tournament_id] = 0
+
+    def save(self, tournament_id, data):
+        with self._lock:
+            self._save_locked(tournament_id, data)
+
+    def capture(self, data, matches):
+        # Al diario solo van los partidos cambiados: se copian esos y la
+        # version, con la misma forma ``rounds[r]["matches"][m]``.
+        rounds = {}
+        for round_index, match_index in matches:
+            match = data["rounds"][round_index]["matches"][match_index]
+            rounds.setdefault(round_index, {"matches": {}})["matches"][
+                match_index
+            ] = copy.deepcopy(match)
+        return {"version": data.get("version", 0), "rounds": rounds}
+
+    def record_results(self, tournament_id, data, matches):
+        lines = []
+        for round_index, match_index in matches:
+            match = data["rounds"][round_index]["matches"][match_index]
+            lines.append(
+                json.dumps(
+                    {
+                        "round_index": round_index,
+                        "match_index": match_index,
+                        "result": match.get("result") or {},
+                        "version": match.get("version", data.get("version", 0)),
+                    },
+                    ensure_ascii=False,
+                    separators=(",", ":"),
+                )
+                + "\n"
+            )
+        if not lines:
+            return
+        with self._lock:
+            with open(self.journal_path(tournament_id), "a", encoding="utf-8") as file:
+                file.writelines(lines)
+                file.flush()
+                if self.fsync:
+                    os.fsync(file.fileno())
+            pending = self._pending.get(tournament_id, 0) + len(lines)
+            self._pending[tournament_id] = pending
+        if pending >= self.compact_every:
+            self.compact(tournament_id)
+
+    def compact(self, tournament_id):
+        # Se reconstruye desde disco: otra peticion puede haber anadido
+        # lineas que la copia en memoria del llamante no conoce.
+        with self._lock:
+            data = self._load_locked(tournament_id)
+            if data is None:
+                return
+            self._save_locked(tournament_id, data)
+
+    def delete(self, tournament_id):
+        super().delete(tournament_id)
+        with self._lock:
+            self._pending.pop(tournament_id, None)
+            try:
+                os.remove(self.journal_path(tournament_id))
+            except FileNotFoundError:
+                pass
+
+    def recover(self):
+        if not os.path.isdir(self.directory):
+            return []
+        recovered = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(JOURNAL_SUFFIX):
+                continue
+            tournament_id = filename[: -len(JOURNAL_SUFFIX)]
+            if not self.exists(tournament_id):
+                continue
+            try:
+                self.compact(tournament_id)
+            except (OSError, ValueError):
+                continue
+            recovered.append(tournament_id)
+        return recovered
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def create_storage(directory, mode=None):
+    mode = (mode or os.environ.get("GTR_STORAGE") or "snapshot").lower()
+    generations = max(0, _env_int("GTR_GENERATIONS", GENERATIONS))
+    if mode == "journal":
+        compact_every = _env_int("GTR_JOURNAL_COMPACT", COMPACT_EVERY)
+        return JournalStorage(
+            directory, compact_every=compact_every, generations=generations
+        )
+    if mode != "snapshot":
+        print(f"Modo de almacenamiento desconocido '{mode}', uso snapshot.")
+    return SnapshotStorage(directory, generations=generations)
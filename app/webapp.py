@@ -0,0 +1,597 @@
+import copy
+import os
+from datetime import datetime
+
+from flask import Flask, Response, jsonify, render_template, request
+
+import live_state
+from catalog import TournamentCatalog
+from events import (
+    CATALOG_CHANNEL,
+    KEEPALIVE_SECONDS,
+    EventBroker,
+    build_result_events,
+)
+from live_state import freeze
+from repository import VersionConflict, create_repository
+from schedule_jobs import JOB_TIME_BUDGET, ScheduleJobs
+from scheduler import (
+    RESCHEDULE_BUDGET,
+    TIME_BUDGET,
+    ScheduleCache,
+    ScheduleError,
+    generate_schedule,
+    reschedule,
+)
+from storage import create_storage
+
+TOURNAMENTS_DIR = os.path.join(os.path.dirname(__file__), "Torneos")
+SCHEDULES_DIR = os.path.join(os.path.dirname(__file__), "Calendarios")
+
+
+def validate_filename(name):
+    invalid_chars = '<>:"/\\|?*'
+    if not name or name in (".", ".."):
+        return False
+    if name.endswith(" ") or name.endswith("."):
+        return False
+    return not any(ch in invalid_chars for ch in name)
+
+
+def _is_int(value):
+    # JSON true/false llegan como bool, que en Python tambien es int.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def parse_result_patch(patch):
+    """``(ronda, partido, resultado, version_esperada)`` o ``None`` si esta mal.
+
+    Solo comprueba la forma; si los indices existen lo dice el repositorio.
+    """
+    if not isinstance(patch, dict):
+        return None
+    round_index = patch.get("round_index")
+    match_index = patch.get("match_index")
+    result = patch.get("result", {})
+    expected = patch.get("expected_version")
+    if not _is_int(round_index) or not _is_int(match_index):
+        return None
+    if not isinstance(result, dict) or any(
+        result.get(team) is not None and not _is_int(result.get(team))
+        for team in ("teamA", "teamB")
+    ):
+        return None
+    if expected is not None and not _is_int(expected):
+        return None
+    return round_index, match_index, result, expected
+
+
+def create_app(config=None):
+    """Construye la app Flask sin arrancar servidor ni interfaz.
+
+    ``config`` es un dict opcional: ``tournaments_dir``, ``schedules_dir``,
+    ``storage`` (o ``storage_mode``), ``flush_delay``, ``broker`` y
+    ``live_state`` (cualquier objeto con la API del modulo ``live_state``,
+    que es el de por defecto). Las claves en mayusculas pasan a
+    ``app.config``. Las piezas quedan en ``app.extensions["torneos"]``.
+    """
+    config = config or {}
+    tournaments_dir = config.get("tournaments_dir") or TOURNAMENTS_DIR
+    app = Flask(__name__, template_folder="web/templates")
+    app.config.update({key: value for key, value in config.items() if key.isupper()})
+    storage = config.get("storage") or create_storage(
+        tournaments_dir, config.get("storage_mode")
+    )
+    for tournament_id in storage.recover():
+        print(f"Diario recuperado para el torneo: {tournament_id}")
+    repository = create_repository(storage, config.get("flush_delay"))
+    catalog = TournamentCatalog(
+        tournaments_dir,
+        lambda tournament_id: repository.get(tournament_id, cache=False),
+    )
+    repository.add_flush_listener(catalog.refresh)
+    broker = config.get("broker") or EventBroker()
+    live = config.get("live_state") or live_state
+    schedule_cache = ScheduleCache(config.get("schedules_dir") or SCHEDULES_DIR)
+    schedule_jobs = ScheduleJobs(broker)
+    app.extensions["torneos"] = {
+        "storage": storage,
+        "repository": repository,
+        "catalog": catalog,
+        "broker": broker,
+        "live_state": live,
+        "schedule_jobs": schedule_jobs,
+    }
+
+    def publish_changes(tournament_id, data, changes):
+        if changes is None:
+            # Jugadores o rondas nuevos: los clientes vuelven a cargar.
+            broker.publish(tournament_id, [{"type": "reload"}], data.get("version", 0))
+            return
+        events = build_result_events(
+            data, changes, repository.ranking(tournament_id)
+        )
+        broker.publish(tournament_id, events, data.get("version", 0))
+
+    repository.add_listener(publish_changes)
+
+    def publish_catalog(item, changed=True):
+        if changed:
+            broker.publish(CATALOG_CHANNEL, [{"type": "catalog", "tournament": item}])
+
+    def tournament_etag(tournament_id, version):
+        return f"{tournament_id}-{version}"
+
+    def versioned(response, tournament_id, version):
+        response.set_etag(tournament_etag(tournament_id, version))
+        response.headers["X-Tournament-Version"] = str(version)
+        return response
+
+    def expected_from_headers(tournament_id):
+        # If-Match con la ETag del torneo o X-Expected-Version con el numero.
+        header = request.headers.get("X-Expected-Version", type=int)
+        if header is not None:
+            return header
+        prefix = f"{tournament_id}-"
+        for etag in request.if_match.as_set():
+            if etag.startswith(prefix) and etag[len(prefix) :].isdigit():
+                return int(etag[len(prefix) :])
+        return None
+
+    def conflict_response(tournament_id, conflict):
+        # Se devuelve el estado actual de los partidos en conflicto para que
+        # el cliente lo muestre antes de reintentar.
+        data = repository.get(tournament_id)
+        conflicts = []
+        for round_index, match_index in conflict.matches:
+            match = data["rounds"][round_index]["matches"][match_index]
+            conflicts.append(
+                {
+                    "round_index": round_index,
+                    "match_index": match_index,
+                    "result": dict(match.get("result") or {}),
+                    "version": match.get("version", 0),
+                }
+            )
+        response = jsonify(
+            {
+                "error": "Resultado modificado por otro dispositivo",
+                "version": conflict.version,
+                "conflicts": conflicts,
+            }
+        )
+        response.status_code = 409
+        return versioned(response, tournament_id, conflict.version)
+
+    def event_stream(channel, version):
+        since = request.headers.get("Last-Event-ID", type=int)
+        if since is None:
+            since = request.args.get("since", type=int)
+        if since is None:
+            since = version
+        return Response(
+            broker.stream(channel, since),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.route("/")
+    def index():
+        return render_template("home.html")
+
+    @app.route("/nuevo")
+    def new_tournament():
+        return render_template("index.html")
+
+    @app.route("/abrir")
+    def open_tournament():
+        return render_template("open.html")
+
+    def tournament_snapshot(tournament_id):
+        """``(torneo, clasificacion)`` inmutables, o ``(None, None)``.
+
+        De un torneo abierto se sirve la foto que ya publico quien escribio;
+        si no, se congela una con el cerrojo del torneo para no leerlo a
+        medio cambiar.
+        """
+        data, _version = live.get_tournament(tournament_id)
+        if data is not None:
+            return data, live.get_tournament_ranking(tournament_id)
+        if repository.get(tournament_id) is None:
+            return None, None
+        with repository.lock(tournament_id):
+            data = repository.get(tournament_id)
+            if data is None:
+                return None, None
+            return freeze(data), freeze(repository.ranking(tournament_id))
+
+    @app.route("/results/<tournament_id>")
+    def results(tournament_id):
+        data, _rows = tournament_snapshot(tournament_id)
+        if data is None:
+            return "Torneo no encontrado", 404
+        return render_template("results.html", tournament=data)
+
+    @app.route("/clasificacion")
+    def ranking():
+        tournament_id = request.args.get("id")
+        if tournament_id:
+            tournament, rows = tournament_snapshot(tournament_id)
+        else:
+            tournament, _version = live.get_current_tournament()
+            rows = live.get_current_ranking()
+        return render_template("ranking.html", tournament=tournament, rows=rows)
+
+    @app.route("/api/tournaments", methods=["POST"])
+    def create_tournament():
+        payload = request.get_json(silent=True)
+        if not payload:
+            return jsonify({"error": "Payload invalido"}), 400
+
+        requested_name = payload.get("name", "").strip()
+        if not requested_name:
+            requested_name = datetime.now().strftime("%Y%m%d%H%M%S")
+        if not validate_filename(requested_name):
+            return jsonify({"error": "Nombre de torneo invalido"}), 400
+        tournament_id = requested_name
+        if repository.exists(tournament_id):
+            return jsonify({"error": "Nombre de torneo existente"}), 409
+        data = {
+            "id": tournament_id,
+            "name": requested_name,
+            "rounds_count": payload.get("rounds_count"),
+            "courts": payload.get("courts"),
+            "players": payload.get("players", []),
+            "rounds": payload.get("rounds", []),
+        }
+        with repository.lock(tournament_id):
+            repository.create(tournament_id, data)
+            publish_catalog(*catalog.update(tournament_id, data))
+            live.set_current_tournament(data, repository.ranking(tournament_id))
+        return jsonify({"id": tournament_id, "redirect": f"/results/{tournament_id}"})
+
+    @app.route("/api/tournaments/exists")
+    def tournament_exists():
+        name = request.args.get("name", "").strip()
+        if not name:
+            return jsonify({"exists": False})
+        if not validate_filename(name):
+            return jsonify({"exists": False})
+        return jsonify({"exists": repository.exists(name)})
+
+    @app.route("/api/ping")
+    def ping():
+        return jsonify({"status": "ok"})
+
+    @app.route("/api/metrics/locks")
+    def lock_metrics():
+        # Por clave: veces tomado, veces que hubo que esperar y cuanto.
+        return jsonify(repository.locks.stats())
+
+    @app.route("/api/schedule", methods=["POST"])
+    def schedule():
+        payload = request.get_json(silent=True)
+        if not payload:
+            return jsonify({"error": "Payload invalido"}), 400
+        players = [
+            str(player).strip()
+            for player in payload.get("players") or []
+            if str(player).strip()
+        ]
+        try:
+            courts = int(payload.get("courts"))
+            rounds_count = int(payload.get("rounds"))
+            time_budget = float(payload.get("time_budget", TIME_BUDGET))
+            seed = payload.get("seed")
+            seed = int(seed) if seed not in (None, "") else None
+            restarts = payload.get("restarts")
+            restarts = int(restarts) if restarts not in (None, "") else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "Parametros invalidos"}), 400
+        try:
+            data = generate_schedule(
+                players,
+                courts,
+                rounds_count,
+                time_budget,
+                seed=seed,
+                engine=payload.get("engine") or "anneal",
+                cache=schedule_cache,
+                restarts=restarts,
+            )
+        except ScheduleError as exc:
+            return jsonify({"error": str(exc)}), 400
+        return jsonify(data)
+
+    @app.route("/api/schedule/jobs", methods=["POST"])
+    def start_schedule_job():
+        payload = request.get_json(silent=True)
+        if not payload:
+            return jsonify({"error": "Payload invalido"}), 400
+        players = [
+            str(player).strip()
+            for player in payload.get("players") or []
+            if str(player).strip()
+        ]
+        try:
+            courts = int(payload.get("courts"))
+            rounds_count = int(payload.get("rounds"))
+            time_budget = float(payload.get("time_budget", JOB_TIME_BUDGET))
+            seed = payload.get("seed")
+            seed = int(seed) if seed not in (None, "") else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "Parametros invalidos"}), 400
+        try:
+            state = schedule_jobs.start(
+                players, courts, rounds_count, time_budget, seed=seed
+            )
+        except ScheduleError as exc:
+            return jsonify({"error": str(exc)}), 400
+        return jsonify(state), 202
+
+    @app.route("/api/schedule/jobs/<job_id>")
+    def schedule_job(job_id):
+        # Con ``since`` espera a que haya algo mas nuevo (long-poll).
+        since = request.args.get("since", type=int)
+        if since is None:
+            state = schedule_jobs.get(job_id)
+        else:
+            state = schedule_jobs.wait(job_id, since, KEEPALIVE_SECONDS)
+        if state is None:
+            return jsonify({"error": "Sorteo no encontrado"}), 404
+        return jsonify(state)
+
+    @app.route("/api/schedule/jobs/<job_id>/events")
+    def schedule_job_events(job_id):
+        state = schedule_jobs.get(job_id)
+        if state is None:
+            return jsonify({"error": "Sorteo no encontrado"}), 404
+        return event_stream(schedule_jobs.channel(job_id), state["version"])
+
+    @app.route("/api/schedule/jobs/<job_id>/stop", methods=["POST"])
+    def stop_schedule_job(job_id):
+        state = schedule_jobs.stop(job_id)
+        if state is None:
+            return jsonify({"error": "Sorteo no encontrado"}), 404
+        return jsonify(state)
+
+    @app.route("/api/current/clear", methods=["POST"])
+    def clear_current():
+        live.clear_current_tournament()
+        return jsonify({"status": "ok"})
+
+    @app.route("/api/display")
+    def display():
+        return jsonify(live.display_settings())
+
+    @app.route("/api/display", methods=["POST"])
+    def update_display():
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({"error": "Payload invalido"}), 400
+        if "pin" in payload:
+            tournament_id = payload.get("pin") or None
+            if tournament_id is not None:
+                if repository.get(tournament_id) is None:
+                    return jsonify({"error": "Torneo no encontrado"}), 404
+                with repository.lock(tournament_id):
+                    data = repository.get(tournament_id)
+                    live.add_tournament(data, repository.ranking(tournament_id))
+            live.pin_display(tournament_id)
+        if "rotate_seconds" in payload:
+            try:
+                live.set_rotation(int(payload.get("rotate_seconds") or 0))
+            except (TypeError, ValueError):
+                return jsonify({"error": "Parametros invalidos"}), 400
+        return jsonify(live.display_settings())
+
+    @app.route("/api/tournaments/list")
+    def list_tournaments():
+        os.makedirs(tournaments_dir, exist_ok=True)
+        tournaments_path = os.path.abspath(tournaments_dir)
+        print(f"Leo los torneos de la ubicacion: {tournaments_path}")
+        return jsonify(
+            {"tournaments": catalog.list(), "version": broker.version(CATALOG_CHANNEL)}
+        )
+
+    @app.route("/api/tournaments/events")
+    def catalog_events():
+        return event_stream(CATALOG_CHANNEL, broker.version(CATALOG_CHANNEL))
+
+    @app.route("/api/tournaments/<tournament_id>/events")
+    def tournament_events(tournament_id):
+        data = repository.get(tournament_id)
+        if data is None:
+            return jsonify({"error": "Torneo no encontrado"}), 404
+        version = broker.ensure(tournament_id, data.get("version", 0))
+        return event_stream(tournament_id, version)
+
+    @app.route("/api/tournaments/<tournament_id>/ranking")
+    def tournament_ranking(tournament_id):
+        data = repository.get(tournament_id)
+        if data is None:
+            return jsonify({"error": "Torneo no encontrado"}), 404
+        version = data.get("version", 0)
+        etag = tournament_etag(tournament_id, version)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = jsonify(
+                {
+                    "id": tournament_id,
+                    "version": version,
+                    "rows": repository.ranking(tournament_id),
+                }
+            )
+        response.headers["Cache-Control"] = "no-cache"
+        return versioned(response, tournament_id, version)
+
+    @app.route("/api/tournaments/<tournament_id>/open", methods=["POST"])
+    def open_tournament_api(tournament_id):
+        # Sin torneo no se crea un cerrojo para un id cualquiera.
+        if not repository.exists(tournament_id):
+            return jsonify({"error": "Torneo no encontrado"}), 404
+        with repository.lock(tournament_id):
+            data = repository.get(tournament_id)
+            if data is None:
+                return jsonify({"error": "Torneo no encontrado"}), 404
+            live.set_current_tournament(data, repository.ranking(tournament_id))
+        return jsonify({"status": "ok", "redirect": f"/results/{tournament_id}"})
+
+    @app.route("/api/tournaments/<tournament_id>", methods=["DELETE"])
+    def delete_tournament(tournament_id):
+        if not repository.exists(tournament_id):
+            return jsonify({"error": "Torneo no encontrado"}), 404
+        with repository.lock(tournament_id):
+            try:
+                repository.delete(tournament_id)
+            except OSError:
+                return jsonify({"error": "No se pudo borrar"}), 500
+            catalog.remove(tournament_id)
+            broker.publish(tournament_id, [{"type": "deleted"}])
+            broker.publish(CATALOG_CHANNEL, [{"type": "deleted", "id": tournament_id}])
+            live.remove_tournament(tournament_id)
+        return jsonify({"status": "ok"})
+
+    @app.route("/api/tournaments/<tournament_id>/reschedule", methods=["POST"])
+    def reschedule_tournament(tournament_id):
+        payload = request.get_json(silent=True)
+        if not payload:
+            return jsonify({"error": "Payload invalido"}), 400
+        data = repository.get(tournament_id)
+        if data is None:
+            return jsonify({"error": "Torneo no encontrado"}), 404
+
+        players = [
+            str(player).strip()
+            for player in payload.get("players") or []
+            if str(player).strip()
+        ]
+        with repository.lock(tournament_id):
+            current_rounds = copy.deepcopy(data.get("rounds") or [])
+        try:
+            first_round = int(payload.get("from_round"))
+            rounds_count = int(
+                payload.get("rounds") or data.get("rounds_count") or len(current_rounds)
+            )
+            courts = int(payload.get("courts") or data.get("courts"))
+            time_budget = float(payload.get("time_budget", RESCHEDULE_BUDGET))
+            seed = payload.get("seed")
+            seed = int(seed) if seed not in (None, "") else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "Parametros invalidos"}), 400
+        if not 0 <= first_round <= len(current_rounds) or rounds_count <= first_round:
+            return jsonify({"error": "Indices invalidos"}), 400
+
+        try:
+            schedule = reschedule(
+                players,
+                courts,
+                current_rounds[:first_round],
+                rounds_count - first_round,
+                time_budget,
+                seed=seed,
+            )
+        except ScheduleError as exc:
+            return jsonify({"error": str(exc)}), 400
+        # El sorteo va sin cerrojo; solo se retiene para sustituir y avisar.
+        with repository.lock(tournament_id):
+            try:
+                data = repository.replace_rounds(
+                    tournament_id, schedule["players"], first_round, schedule["rounds"]
+                )
+            except (IndexError, KeyError):
+                return jsonify({"error": "Torneo no encontrado"}), 404
+            except ValueError as exc:
+                return jsonify({"error": str(exc)}), 409
+            except OSError:
+                return jsonify({"error": "No se pudo guardar"}), 500
+
+            publish_catalog(*catalog.update(tournament_id, data))
+            live.publish_tournament(data, repository.ranking(tournament_id))
+        return jsonify(
+            {
+                "status": "ok",
+                "version": data.get("version", 0),
+                "seed": schedule["seed"],
+                "metrics": schedule["metrics"],
+            }
+        )
+
+    @app.route("/api/tournaments/<tournament_id>/results", methods=["POST"])
+    def update_results(tournament_id):
+        payload = request.get_json(silent=True)
+        if not payload:
+            return jsonify({"error": "Payload invalido"}), 400
+
+        patch = parse_result_patch(payload)
+        if patch is None:
+            return jsonify({"error": "Payload invalido"}), 400
+        round_index, match_index, result, expected = patch
+
+        if repository.get(tournament_id) is None:
+            return jsonify({"error": "Torneo no encontrado"}), 404
+
+        if expected is None:
+            expected = expected_from_headers(tournament_id)
+
+        with repository.lock(tournament_id):
+            try:
+                data = repository.update_results(
+                    tournament_id, [(round_index, match_index, result, expected)]
+                )
+            except VersionConflict as exc:
+                return conflict_response(tournament_id, exc)
+            except (IndexError, KeyError):
+                return jsonify({"error": "Partido no encontrado"}), 404
+
+            publish_catalog(*catalog.update(tournament_id, data))
+            live.publish_tournament(
+                data,
+                repository.ranking(tournament_id),
+                matches=[(round_index, match_index)],
+            )
+        return versioned(
+            jsonify({"status": "ok", "version": data.get("version", 0)}),
+            tournament_id,
+            data.get("version", 0),
+        )
+
+    @app.route("/api/tournaments/<tournament_id>/results/batch", methods=["POST"])
+    def update_results_batch(tournament_id):
+        payload = request.get_json(silent=True)
+        patches = payload.get("patches") if isinstance(payload, dict) else None
+        if not patches or not isinstance(patches, list):
+            return jsonify({"error": "Payload invalido"}), 400
+
+        if repository.get(tournament_id) is None:
+            return jsonify({"error": "Torneo no encontrado"}), 404
+
+        parsed = []
+        for index, patch in enumerate(patches):
+            patch = parse_result_patch(patch)
+            if patch is None:
+                return jsonify({"error": "Payload invalido", "patch": index}), 400
+            parsed.append(patch)
+
+        with repository.lock(tournament_id):
+            try:
+                data = repository.update_results(tournament_id, parsed)
+            except VersionConflict as exc:
+                return conflict_response(tournament_id, exc)
+            except (IndexError, KeyError):
+                return jsonify({"error": "Partido no encontrado"}), 404
+
+            publish_catalog(*catalog.update(tournament_id, data))
+            live.publish_tournament(
+                data,
+                repository.ranking(tournament_id),
+                matches=[(round_index, match_index) for round_index, match_index, *_ in parsed],
+            )
+        return versioned(
+            jsonify({"status": "ok", "version": data.get("version", 0)}),
+            tournament_id,
+            data.get("version", 0),
+        )
+
+    return app
@@ -0,0 +1,354 @@
+"""Carga y latencia de la API de torneos con muchos telefonos a la vez.
+
+Crea un torneo sintetico (40 jugadores, 20 rondas) y lanza N telefonos en
+hilos: cada uno apunta resultados en su pista ronda tras ronda y de vez en
+cuando abre la lista de torneos o la hoja de resultados. Mide p50/p95/p99
+por endpoint, peticiones por segundo y bytes escritos a disco por peticion.
+Un resultado que choca (409) se reintenta con la version devuelta; cada
+reintento cuenta como peticion y los que se agotan salen como perdidos.
+
+Se puede ejecutar dentro del proceso (cliente de pruebas de Flask) o contra
+un servidor local real (WebServer en un puerto libre). Cada combinacion de
+destino y almacenamiento es una fila del JSON de salida, asi que las
+ejecuciones se comparan directamente entre backends.
+
+Uso:
+    python benchmarks/api_bench.py --phones 50
+    python benchmarks/api_bench.py --target client --target server --storage snapshot --storage journal
+    python benchmarks/api_bench.py --target server --server-mode waitress --output resultados.json
+"""
+
+import argparse
+import builtins
+import contextlib
+import http.client
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+sys.path.insert(0, APP_DIR)
+
+import scheduler  # noqa: E402
+import storage  # noqa: E402
+from webapp import create_app  # noqa: E402
+from server import WebServer  # noqa: E402
+
+PLAYERS = 40
+ROUNDS = 20
+COURTS = PLAYERS // 4
+PHONES = 20
+REQUESTS = 40
+# Probabilidad de que tras apuntar un resultado el telefono lea algo.
+LIST_RATIO = 0.1
+PAGE_RATIO = 0.1
+SEED = 1
+# Reintentos de un resultado que choca con otro telefono antes de darlo por perdido.
+RETRIES = 3
+ENDPOINTS = ("update_results", "list_tournaments", "results_page")
+TARGETS = ("client", "server")
+
+
+class WriteCounter:
+    """Cuenta los bytes que ``storage`` (y el catalogo) escriben a disco."""
+
+    def __init__(self):
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def open(self, file, mode="r", *args, **kwargs):
+        handle = builtins.open(file, mode, *args, **kwargs)
+        if not any(flag in mode for flag in "wax+"):
+            return handle
+        write = handle.write
+
+        def counted(data):
+            written = write(data)
+            size = len(data.encode("utf-8")) if isinstance(data, str) else len(data)
+            with self._lock:
+                self.bytes += size
+            return written
+
+        handle.write = counted
+        return handle
+
+    def reset(self):
+        with self._lock:
+            self.bytes = 0
+
+
+def synthetic_tournament(name):
+    players = [f"J{index:02d}" for index in range(PLAYERS)]
+    schedule = scheduler.generate_schedule(
+        players, COURTS, ROUNDS, seed=SEED, engine="greedy", cache=None
+    )
+    return {
+        "name": name,
+        "players": players,
+        "courts": schedule["courts"],
+        "rounds_count": ROUNDS,
+        "rounds": schedule["rounds"],
+    }
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+class ClientTransport:
+    """Peticiones con el cliente de pruebas de Flask (sin red)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def session(self):
+        client = self.app.test_client()
+
+        def request(method, path, body=None):
+            response = client.open(path, method=method, json=body)
+            return response.status_code, response.get_data()
+
+        return request
+
+
+class ServerTransport:
+    """Peticiones HTTP con keep-alive contra un servidor local."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+    def session(self):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+
+        def request(method, path, body=None):
+            headers = {}
+            payload = None
+            if body is not None:
+                payload = json.dumps(body)
+                headers["Content-Type"] = "application/json"
+            try:
+                connection.request(method, path, payload, headers)
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                return 0, b""
+
+        return request
+
+
+def phone(transport, tournament_id, index, requests, samples, errors):
+    request = transport.session()
+    rng = random.Random(SEED * 1000 + index)
+    court = index % COURTS
+    version = 0
+    counts = errors["update_results"]
+    for number in range(requests):
+        round_index = number % ROUNDS
+        result = {"teamA": rng.randint(0, 7), "teamB": rng.randint(0, 7)}
+        path = f"/api/tournaments/{tournament_id}/results"
+        for attempt in range(RETRIES + 1):
+            body = {
+                "round_index": round_index,
+                "match_index": court,
+                "result": result,
+                "expected_version": version,
+            }
+            started = time.perf_counter()
+            status, content = request("POST", path, body)
+            samples["update_results"].append(time.perf_counter() - started)
+            if attempt:
+                counts["retries"] += 1
+            if status == 200:
+                version = json.loads(content)["version"]
+                break
+            if status != 409:
+                counts["errors"] += 1
+                break
+            # Otro telefono en la misma pista: se reintenta con la version nueva.
+            version = json.loads(content)["version"]
+            counts["conflicts"] += 1
+        else:
+            counts["dropped"] += 1
+        roll = rng.random()
+        if roll < LIST_RATIO:
+            call = ("list_tournaments", "/api/tournaments/list")
+        elif roll < LIST_RATIO + PAGE_RATIO:
+            call = ("results_page", f"/results/{tournament_id}")
+        else:
+            continue
+        endpoint, path = call
+        started = time.perf_counter()
+        status, _content = request("GET", path)
+        samples[endpoint].append(time.perf_counter() - started)
+        if status != 200:
+            errors[endpoint]["errors"] += 1
+
+
+def run_case(target, storage_mode, args, counter):
+    directory = tempfile.mkdtemp(prefix="api_bench_")
+    tournament_id = f"bench-{target}-{storage_mode}"
+    server = None
+    state = None
+    try:
+        app = create_app(
+            {
+                "tournaments_dir": os.path.join(directory, "Torneos"),
+                "schedules_dir": os.path.join(directory, "Calendarios"),
+                "storage_mode": storage_mode,
+                "flush_delay": args.flush_delay,
+                "TESTING": True,
+            }
+        )
+        state = app.extensions["torneos"]
+        if target == "server":
+            server = WebServer(
+                app, "127.0.0.1", 0, mode=args.server_mode, threads=args.threads
+            )
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            transport = ServerTransport("127.0.0.1", server.port)
+        else:
+            transport = ClientTransport(app)
+        status, content = transport.session()(
+            "POST", "/api/tournaments", synthetic_tournament(tournament_id)
+        )
+        if status != 200:
+            raise RuntimeError(f"No se pudo crear el torneo: {status} {content[:200]!r}")
+        state["repository"].flush()
+        counter.reset()
+
+        samples = {endpoint: [] for endpoint in ENDPOINTS}
+        errors = {
+            endpoint: {"errors": 0, "conflicts": 0, "retries": 0, "dropped": 0}
+            for endpoint in ENDPOINTS
+        }
+        threads = [
+            threading.Thread(
+                target=phone,
+                args=(transport, tournament_id, index, args.requests, samples, errors),
+            )
+            for index in range(args.phones)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        # La escritura diferida tambien cuenta: se vacia antes de medir.
+        state["repository"].flush()
+        written = counter.bytes
+    finally:
+        if server is not None:
+            server.shutdown(timeout=1.0)
+        if state is not None:
+            state["schedule_jobs"].close()
+            state["repository"].close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    total = sum(len(values) for values in samples.values())
+    updates = len(samples["update_results"])
+    result = {
+        "target": target,
+        "storage": storage_mode,
+        "server_mode": server.settings["mode"] if server else None,
+        "phones": args.phones,
+        "requests": total,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1) if elapsed else None,
+        "bytes_written": written,
+        "bytes_per_request": round(written / total, 1) if total else None,
+        "bytes_per_update": round(written / updates, 1) if updates else None,
+        "endpoints": {},
+    }
+    for endpoint in ENDPOINTS:
+        values = samples[endpoint]
+        result["endpoints"][endpoint] = dict(
+            errors[endpoint],
+            count=len(values),
+            **{
+                f"p{int(fraction * 100)}_ms": round(percentile(values, fraction) * 1000, 2)
+                if values
+                else None
+                for fraction in (0.5, 0.95, 0.99)
+            },
+        )
+    return result
+
+
+def print_result(result):
+    print(
+        f"{result['target']:>6} {result['storage']:>8}  {result['requests']:6} pet.  "
+        f"{result['throughput_rps']:8.1f} pet/s  {result['bytes_per_request']:9.1f} B/pet",
+        file=sys.stderr,
+    )
+    for endpoint, stats in result["endpoints"].items():
+        if not stats["count"]:
+            continue
+        print(
+            f"{'':16}{endpoint:>17}  n={stats['count']:<5} "
+            f"p50 {stats['p50_ms']:7.2f}  p95 {stats['p95_ms']:7.2f}  "
+            f"p99 {stats['p99_ms']:7.2f} ms  errores {stats['errors']}  "
+            f"conflictos {stats['conflicts']}  reintentos {stats['retries']}  "
+            f"perdidos {stats['dropped']}",
+            file=sys.stderr,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", action="append", choices=TARGETS, help="destino")
+    parser.add_argument(
+        "--storage", action="append", choices=("snapshot", "journal"), help="backend"
+    )
+    parser.add_argument("--phones", type=int, default=PHONES, help="telefonos a la vez")
+    parser.add_argument(
+        "--requests", type=int, default=REQUESTS, help="resultados por telefono"
+    )
+    parser.add_argument(
+        "--flush-delay", type=float, default=None, help="GTR_FLUSH_DELAY del repositorio"
+    )
+    parser.add_argument("--server-mode", default=None, help="GTR_SERVER del servidor")
+    parser.add_argument("--threads", type=int, default=None, help="hilos del servidor")
+    parser.add_argument("--output", help="fichero JSON con los resultados")
+    args = parser.parse_args(argv)
+
+    # El registro por peticion del servidor de desarrollo falsea la medida.
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    counter = WriteCounter()
+    storage.open = counter.open
+    results = []
+    try:
+        for target in args.target or ["client"]:
+            for storage_mode in args.storage or ["snapshot", "journal"]:
+                # Los avisos que las rutas imprimen no deben mezclarse con el JSON.
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = run_case(target, storage_mode, args, counter)
+                results.append(result)
+                print_result(result)
+    finally:
+        del storage.open
+
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(payload + "\n")
+    else:
+        print(payload)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Compara el emparejador exhaustivo de match_scheduler con el podado.
+
+Uso:
+    python benchmarks/matcher_bench.py
+    python benchmarks/matcher_bench.py --shape 64x16x30 --shape 40x2x20
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import match_scheduler  # noqa: E402
+
+DEFAULT_SHAPES = ("9x2x12", "16x4x10", "24x6x12", "40x2x20", "40x10x20", "64x8x30")
+# Por encima de esto el exhaustivo en Python puro tarda minutos.
+PYTHON_LIMIT = 24
+
+
+def parse_shape(text):
+    players, courts, rounds = (int(part) for part in text.lower().split("x"))
+    return players, courts, rounds
+
+
+def run_case(players, courts, rounds, matcher, backend):
+    names = [f"J{index:03d}" for index in range(players)]
+    started = time.perf_counter()
+    data = match_scheduler.generate_schedule(
+        names, courts, rounds, matcher=matcher, backend=backend
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        "matcher": matcher,
+        "backend": backend,
+        "seconds": round(elapsed, 4),
+        "score": match_scheduler.score_schedule(data),
+        "unmet_pairs": len(data["unmet_pairs"]),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shape", action="append", help="jugadoresxpistasxrondas")
+    parser.add_argument("--json", action="store_true", help="salida en JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    for text in args.shape or DEFAULT_SHAPES:
+        players, courts, rounds = parse_shape(text)
+        cases = [("pruned", "python")]
+        if match_scheduler.np is not None:
+            cases.append(("exhaustive", "numpy"))
+        if min(players, courts * 4) <= PYTHON_LIMIT:
+            cases.append(("exhaustive", "python"))
+        for matcher, backend in cases:
+            result = run_case(players, courts, rounds, matcher, backend)
+            result["shape"] = text
+            results.append(result)
+            if not args.json:
+                print(
+                    f"{text:>10}  {matcher:>10}/{backend:<6}  "
+                    f"{result['seconds']:8.3f} s  score {result['score']:10.1f}  "
+                    f"parejas sin jugar {result['unmet_pairs']}"
+                )
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
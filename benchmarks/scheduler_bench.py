@@ -0,0 +1,285 @@
+"""Rendimiento y calidad de los motores de calendario.
+
+Recorre una rejilla de (jugadores, pistas, rondas) -- por defecto las
+formas de los torneos guardados en app/Torneos mas algunas grandes -- y
+apunta tiempo, memoria pico, parejas sin estrenar, rivales repetidos y
+diferencia de descansos. Con --baseline compara contra un JSON anterior y
+sale con codigo 1 si algo empeora.
+
+Ademas de los motores del servidor (scheduler.ENGINES) mide el emparejador
+exhaustivo de match_scheduler ("exhaustive", el algoritmo de siempre) y el
+generador del navegador de index.html ("js", con node). Si falta node, o
+NumPy y el caso es demasiado grande para el exhaustivo en Python puro, ese
+motor se salta y se avisa por stderr. La memoria del "js" no se mide.
+
+Uso:
+    python benchmarks/scheduler_bench.py --output resultados.json
+    python benchmarks/scheduler_bench.py --baseline benchmarks/scheduler_baseline.json
+    python benchmarks/scheduler_bench.py --baseline benchmarks/scheduler_baseline.json --update
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+sys.path.insert(0, APP_DIR)
+
+import match_scheduler  # noqa: E402
+import scheduler  # noqa: E402
+
+EXTRA_SHAPES = ((16, 4, 15), (24, 6, 15), (40, 10, 20), (64, 16, 30))
+SEED = 1
+# Iteraciones fijas: mismo resultado en cualquier maquina.
+MAX_ITERATIONS = 60000
+TIME_LIMIT = 60.0
+QUALITY_FIELDS = (
+    "unmet_partner_pairs",
+    "repeated_partners",
+    "repeated_opponents",
+    "rest_spread",
+)
+TIME_FACTOR = 2.0
+MEMORY_FACTOR = 1.5
+ENGINES = scheduler.ENGINES + ("exhaustive", "js")
+# Por encima de esto el exhaustivo en Python puro tarda minutos.
+EXHAUSTIVE_PYTHON_LIMIT = 24
+INDEX_HTML = os.path.join(APP_DIR, "web", "templates", "index.html")
+JS_RUNNER = """
+const generate = (%s)();
+const [players, courts, rounds, seed] = JSON.parse(process.argv[1]);
+const started = process.hrtime.bigint();
+const result = generate(players, courts, rounds, seed);
+const seconds = Number(process.hrtime.bigint() - started) / 1e9;
+process.stdout.write(JSON.stringify({ seconds, rounds: result }));
+"""
+
+
+def saved_shapes(directory=os.path.join(APP_DIR, "Torneos")):
+    shapes = set()
+    if not os.path.isdir(directory):
+        return shapes
+    for filename in os.listdir(directory):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, filename), "r", encoding="utf-8") as file:
+                data = json.load(file)
+            players = len(data.get("players") or [])
+            courts = int(data.get("courts") or 0)
+            rounds = len(data.get("rounds") or [])
+        except (OSError, ValueError, TypeError):
+            continue
+        if players >= 4 and courts >= 1 and rounds >= 1:
+            shapes.add((players, courts, rounds))
+    return shapes
+
+
+def default_grid():
+    return sorted(saved_shapes() | set(EXTRA_SHAPES))
+
+
+def parse_shape(text):
+    players, courts, rounds = (int(part) for part in text.lower().split("x"))
+    return players, courts, rounds
+
+
+def local_scheduler_source(path=INDEX_HTML):
+    """Texto de ``function localScheduler() {...}`` tal cual esta en la pagina."""
+    with open(path, "r", encoding="utf-8") as file:
+        html = file.read()
+    start = html.index("function localScheduler()")
+    indent = html.rindex("\n", 0, start) + 1
+    end = html.index("\n" + html[indent:start] + "}\n", start)
+    return html[start : end + len(html[indent:start]) + 2]
+
+
+def skip_reason(players, courts, engine):
+    if engine == "js" and shutil.which("node") is None:
+        return "node no esta instalado"
+    if (
+        engine == "exhaustive"
+        and match_scheduler.np is None
+        and min(players, courts * 4) > EXHAUSTIVE_PYTHON_LIMIT
+    ):
+        return "sin NumPy el exhaustivo tarda demasiado"
+    return None
+
+
+def exhaustive_schedule(names, courts, rounds):
+    data = match_scheduler.generate_schedule(names, courts, rounds, matcher="exhaustive")
+    if data["error"]:
+        raise scheduler.ScheduleError(data["error"])
+    # Sin barajar, los indices del voraz son los de ``names``.
+    return [
+        (list(round_data["matches"]), sorted(round_data["resting"]))
+        for round_data in data["rounds"]
+    ]
+
+
+def run_js_case(names, courts, rounds):
+    """``(segundos, calendario)`` del generador de index.html, medido en node."""
+    usable = scheduler.usable_courts(len(names), courts)
+    payload = json.dumps([names, usable, rounds, SEED])
+    completed = subprocess.run(
+        ["node", "-e", JS_RUNNER % local_scheduler_source(), payload],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    output = json.loads(completed.stdout)
+    position = {name: index for index, name in enumerate(names)}
+
+    def team(players):
+        return tuple(position[name] for name in players)
+
+    schedule = [
+        (
+            [
+                (team(match["pairing"][0]), team(match["pairing"][1]))
+                for match in round_data["matches"]
+            ],
+            sorted(position[name] for name in round_data["bench"]),
+        )
+        for round_data in output["rounds"]
+    ]
+    return output["seconds"], schedule
+
+
+def run_case(players, courts, rounds, engine, restarts=1):
+    names = [f"J{index:03d}" for index in range(players)]
+    result = {"shape": f"{players}x{courts}x{rounds}", "engine": engine}
+    if engine == "js":
+        elapsed, schedule = run_js_case(names, courts, rounds)
+        result.update(seconds=round(elapsed, 4), peak_kib=None)
+        result.update(scheduler.schedule_metrics(players, schedule))
+        return result
+
+    def generate():
+        if engine == "exhaustive":
+            schedule = exhaustive_schedule(names, courts, rounds)
+            return {"metrics": scheduler.schedule_metrics(players, schedule)}
+        return scheduler.generate_schedule(
+            names,
+            courts,
+            rounds,
+            time_budget=TIME_LIMIT,
+            seed=SEED,
+            engine=engine,
+            max_iterations=MAX_ITERATIONS,
+            restarts=restarts,
+        )
+
+    started = time.perf_counter()
+    data = generate()
+    elapsed = time.perf_counter() - started
+    # Segunda pasada solo para la memoria: tracemalloc frena mucho.
+    tracemalloc.start()
+    generate()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result.update(seconds=round(elapsed, 4), peak_kib=round(peak / 1024, 1))
+    result.update(data["metrics"])
+    return result
+
+
+def compare(results, baseline, time_factor=TIME_FACTOR, memory_factor=MEMORY_FACTOR):
+    previous = {(item["shape"], item["engine"]): item for item in baseline}
+    problems = []
+    for result in results:
+        before = previous.get((result["shape"], result["engine"]))
+        if before is None:
+            continue
+        label = f"{result['shape']} {result['engine']}"
+        for field in QUALITY_FIELDS:
+            if result[field] > before[field]:
+                problems.append(f"{label}: {field} {before[field]} -> {result[field]}")
+        # Margen minimo para que los casos de milisegundos no den falsos avisos.
+        if result["seconds"] > max(before["seconds"] * time_factor, before["seconds"] + 0.05):
+            problems.append(
+                f"{label}: tiempo {before['seconds']} s -> {result['seconds']} s"
+            )
+        if result["peak_kib"] is None or before["peak_kib"] is None:
+            continue
+        if result["peak_kib"] > max(before["peak_kib"] * memory_factor, before["peak_kib"] + 64):
+            problems.append(
+                f"{label}: memoria {before['peak_kib']} KiB -> {result['peak_kib']} KiB"
+            )
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shape", action="append", help="jugadoresxpistasxrondas")
+    parser.add_argument(
+        "--engine", action="append", choices=ENGINES, help="motor a medir"
+    )
+    parser.add_argument("--output", help="fichero JSON con los resultados")
+    parser.add_argument("--baseline", help="JSON de referencia para detectar regresiones")
+    parser.add_argument(
+        "--update", action="store_true", help="reescribe --baseline con estos resultados"
+    )
+    parser.add_argument("--time-factor", type=float, default=TIME_FACTOR)
+    parser.add_argument(
+        "--restarts",
+        type=int,
+        default=1,
+        help="arranques en paralelo del recocido (la referencia usa 1)",
+    )
+    args = parser.parse_args(argv)
+
+    shapes = [parse_shape(text) for text in args.shape] if args.shape else default_grid()
+    engines = args.engine or list(ENGINES)
+    results = []
+    for players, courts, rounds in shapes:
+        for engine in engines:
+            reason = skip_reason(players, courts, engine)
+            if reason:
+                print(
+                    f"{players}x{courts}x{rounds:<4} {engine:>10}  no se mide: {reason}",
+                    file=sys.stderr,
+                )
+                continue
+            result = run_case(players, courts, rounds, engine, args.restarts)
+            results.append(result)
+            memory = "-" if result["peak_kib"] is None else f"{result['peak_kib']:.1f}"
+            print(
+                f"{result['shape']:>10} {engine:>10}  {result['seconds']:8.3f} s  "
+                f"{memory:>9} KiB  sin estrenar {result['unmet_partner_pairs']:5}  "
+                f"rivales rep. {result['repeated_opponents']:4}  "
+                f"descansos +{result['rest_spread']}",
+                file=sys.stderr,
+            )
+
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(payload + "\n")
+    elif not args.baseline:
+        print(payload)
+
+    if args.baseline:
+        if args.update or not os.path.exists(args.baseline):
+            with open(args.baseline, "w", encoding="utf-8") as file:
+                file.write(payload + "\n")
+            print(f"Referencia guardada en {args.baseline}", file=sys.stderr)
+            return 0
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        problems = compare(results, baseline, time_factor=args.time_factor)
+        if problems:
+            print("Regresiones:", file=sys.stderr)
+            for problem in problems:
+                print(f"  {problem}", file=sys.stderr)
+            return 1
+        print("Sin regresiones.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())